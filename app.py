@@ -1,21 +1,375 @@
-import sys, re, os
-from time import sleep
+import sys, re, os, json, random
+import gzip
+import multiprocessing
+import argparse
+import operator
+import sqlite3
+import threading
+import cProfile, pstats
+from hashlib import sha1
+from time import sleep, monotonic, perf_counter
 from datetime import datetime, time, timedelta
-import tkinter as tk
-import ttkbootstrap as ttk
-from ttkbootstrap import Style
+from contextlib import redirect_stdout, contextmanager, nullcontext
+from collections import deque, OrderedDict
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from queue import Queue, Empty, Full
 from pprint import pprint
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
 
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+
+# default number of concurrent download workers
+WORKERS = 4
+
+# global request budget for merolagani (requests per second, burst size)
+RATE_LIMIT = 3.0
+RATE_BURST = 3
+
+# AIMD bounds of the request rate: +RATE_STEP per quick response, *RATE_BACKOFF on 429/5xx,
+# errors or responses slower than SLOW_RESPONSE seconds
+RATE_MIN = 0.5
+RATE_MAX = 10.0
+RATE_STEP = 0.1
+RATE_BACKOFF = 0.5
+SLOW_RESPONSE = 2.0
+
+# retries of a transient failure with jittered exponential backoff (seconds), then rounds over the retry queue
+RETRIES = 3
+RETRY_BASE = 0.5
+RETRY_CAP = 10.0
+RETRY_ROUNDS = 2
+
+# consecutive failures that pause every fetch for BREAKER_COOLDOWN seconds,
+# pauses in a row without a success before the run stops
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+BREAKER_TRIPS = 3
+
+# milliseconds without keystrokes before the live filter runs
+FILTER_DELAY = 150
+
+# screen results kept for the current version of the data, least recently used ones are dropped
+SCREEN_CACHE_SIZE = 64
+
+# seconds the saved company list is used before it is refreshed
+COMPANIES_TTL = 24 * 60 * 60
+
+# weekdays NEPSE is closed (Monday is 0) and its closing time, holidays are read from holidays.txt
+CLOSED_WEEKDAYS = (5,)
+MARKET_CLOSE = time(15, 0)
+
+# days the dividends, bonus, book value and EPS of a company are used before its detail page
+# is downloaded again, until then only its price is refreshed from the market-wide page
+FUNDAMENTALS_TTL = 90
+
+# downloaded companies described at once, each is staged in the store as soon as it arrives
+FLUSH_EVERY = 25
+
+# processes parsing downloaded pages (0 parses on the download threads, one core is left for them),
+# pages waiting for the processes before downloads block, and the fewest companies worth starting them for
+PARSE_PROCESSES = (os.cpu_count() or 1) - 1
+PARSE_QUEUE = 32
+PARSE_MIN = 50
+
+# days a history snapshot looks back for symbols not scraped on its date
+HISTORY_LOOKBACK = 30
+
+# address of `serve`, seconds between its checks for newly saved data and rows a screen returns by default
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8050
+SERVE_RELOAD = 5.0
+SERVE_LIMIT = 100
+
+# face value of a NEPSE share in rupees, dividends are declared as a percentage of it
+FACE_VALUE = 100
+
+# weights of the z-scores summed by score(), negative weights favour low values
+SCORE_WEIGHTS = {"dvnd_yield": 1.0, "graham_margin": 1.0, "avg_dvnd_prob": 0.5, "P/E Ratio": -0.5, "PBV": -0.5}
+
+# upper bounds in seconds of the stage latency histograms and the number of spans kept
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRIC_SPANS = 100_000
+
+# prometheus (name, label, help) of the latency histograms and of the counters, of scrapes and of the query server
+SCRAPE_METRIC_NAMES = {
+    "seconds": ("fundy_stage_seconds", "stage", "Seconds spent in each stage of the scrape pipeline."),
+    "events": ("fundy_events_total", "event", "Pages, failures and skipped symbols of the scrape pipeline."),
+}
+SERVE_METRIC_NAMES = {
+    "seconds": ("fundy_http_request_seconds", "endpoint", "Seconds to answer a request of the query server."),
+    "events": ("fundy_http_events_total", "event", "Responses by status and reloads of the query server."),
+}
+
+# merolagani address and the browser headers sent with every request
+BASE_URL = os.environ.get("FUNDY_BASE_URL", "https://merolagani.com")
+HEADERS = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36 Edg/108.0.1462.54",
+    "referer": "https://www.google.com/",
+}
+
+# keep-alive connections kept per host by the shared session
+POOL_SIZE = 10
+# seconds to wait for merolagani before giving up on a request
+TIMEOUT = 20
+
+
+# tkinter and ttkbootstrap are imported only when a window is needed
+tk = ttk = Style = None
+
+
+def load_gui():
+    global tk, ttk, Style
+    if tk is None:
+        import tkinter as tk
+        import tkinter.simpledialog  # tk.simpledialog
+        import ttkbootstrap as ttk
+        from ttkbootstrap import Style
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # the gui modules are only imported in gui mode
+    if args.command in (None, "gui"):
+        gui = MyGUI()
+    elif args.command == "scrape":
+        run_scrape(args)
+    elif args.command == "reparse":
+        run_reparse(args)
+    elif args.command == "serve":
+        run_serve(args)
+    elif args.command == "screen":
+        run_screen(args)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="app.py", description="Fundamental analysis of NEPSE companies."
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("gui", help="open the window (default)")
+
+    scrape = commands.add_parser("scrape", help="download outdated companies without a window")
+    scrape.add_argument("--sectors", nargs="+", help="sectors to download, default: all")
+    scrape.add_argument("--symbols", nargs="+", help="symbols to download instead of sectors")
+    scrape.add_argument("--workers", type=int, default=WORKERS)
+    scrape.add_argument(
+        "--processes", type=int, default=PARSE_PROCESSES,
+        help=f"processes parsing the pages of {PARSE_MIN} or more companies, 0 parses on the download threads",
+    )
+    scrape.add_argument(
+        "--full", action="store_true",
+        help="download every outdated company page instead of refreshing prices from the market page",
+    )
+    scrape.add_argument("--metrics", help="write stage timings and counters to this json file and a .prom file next to it")
+    scrape.add_argument("--profile", help="write a cProfile of the run (all download threads) to this file")
+
+    reparse = commands.add_parser("reparse", help="rebuild the saved data from the archived pages, without the network")
+    reparse.add_argument("--date", help="use the pages archived up to YYYY-MM-DD, default: all")
+    reparse.add_argument("--history", action="store_true", help="also rebuild the history snapshot of every archived date")
+    reparse.add_argument(
+        "--processes", type=int, default=PARSE_PROCESSES, help="processes parsing the pages, 0 parses in this one"
+    )
+
+    serve = commands.add_parser("serve", help="answer screens of the saved data over http, for many clients at once")
+    serve.add_argument("--host", default=SERVE_HOST)
+    serve.add_argument("--port", type=int, default=SERVE_PORT)
+    serve.add_argument("--reload", type=float, default=SERVE_RELOAD, help="seconds between checks for newly saved data")
+
+    screen = commands.add_parser("screen", help="filter the saved data")
+    screen.add_argument(
+        "--criteria", nargs="*", default=[],
+        help='conditions like "PBV < 2" or "Sector == \'Hydro Power\'"',
+    )
+    screen.add_argument("--screen", help="add the criteria of this saved screen")
+    screen.add_argument("--save", help="save the criteria as a screen of this name")
+    screen.add_argument("--date", help="screen the saved snapshot as of YYYY-MM-DD, default: latest data")
+    screen.add_argument("--top", type=int, help="only the best scored companies, ranked by score()")
+    screen.add_argument(
+        "--weights", nargs="+", default=[],
+        help='ranks by score() with these weights instead of SCORE_WEIGHTS, e.g. "dvnd_yield=1" "P/E Ratio=-0.5"',
+    )
+    screen.add_argument("--out", help="output file (.json, .csv or .parquet), default: stdout")
+    return parser.parse_args(argv)
+
+
+# machine-readable progress, one json object per line
+def emit(event: str, stream=None, **fields):
+    print(json.dumps({"event": event, **fields}), file=stream if stream else sys.stdout, flush=True)
+
+
+# criterion of format "column op value", e.g. "P/E Ratio < 20"
+def parse_criterion(text: str) -> tuple:
+    matches = re.fullmatch(r"\s*(.+?)\s*((?:<=|>=|==|!=|<|>|=).*)", text)
+    if not matches:
+        raise ValueError(f"Invalid criterion: {text}")
+    return (matches.group(1), *parse_condition(matches.group(2)))
+
+
+def run_scrape(args):
+    start = perf_counter()
+    out = sys.stdout
+
+    # diagnostics of the download go to stderr, progress stays on stdout
+    with redirect_stdout(sys.stderr):
+        if args.symbols:
+            market = NEPSE(companies={})
+            smbl_list = args.symbols
+        else:
+            try:
+                market = NEPSE()  # downloads the company list unless a fresh one is saved
+            except requests.exceptions.RequestException as error:
+                emit(
+                    "error", out,
+                    message=f"could not get the company list: {error}", seconds=round(perf_counter() - start, 3),
+                )
+                sys.exit(1)
+            if unknown := set(args.sectors or []) - set(market.get_sectors()):
+                emit("error", out, message=f"unknown sectors: {sorted(unknown)}")
+                sys.exit(2)
+            smbl_list = market.get_companies(args.sectors)
+
+        def report(symbol, done, total):
+            if symbol is None:
+                emit("start", out, total=total, seconds=round(perf_counter() - start, 3))
+            else:
+                emit(
+                    "progress", out, symbol=symbol, done=done, total=total,
+                    seconds=round(perf_counter() - start, 3),
+                )
+
+        profiler = RunProfiler() if args.profile else None
+        try:
+            with profiler.profile() if profiler else nullcontext():
+                df = market.process_companies(
+                    smbl_list, args.workers, on_progress=report, profiler=profiler, full=args.full,
+                    processes=args.processes,
+                )
+        except requests.exceptions.RequestException as error:
+            # companies downloaded before the error are saved
+            emit("error", out, message=str(error), seconds=round(perf_counter() - start, 3))
+            sys.exit(1)
+
+    if args.metrics:
+        metrics.export(args.metrics)
+    if profiler:
+        profiler.dump(args.profile)
+        profiler.stats(sys.stderr).print_stats(20)
+
+    emit(
+        "done", out,
+        rows=0 if df is None else len(df),
+        seconds=round(perf_counter() - start, 3),
+        failed=market.failed,
+        stages={stage: round(row["total"], 3) for stage, row in metrics.summary().items()},
+        counters=metrics.counters,
+    )
+
+
+def run_reparse(args):
+    start = perf_counter()
+    if args.date:
+        try:
+            datetime.strptime(args.date, "%Y-%m-%d")
+        except ValueError as error:
+            emit("error", message=str(error))
+            sys.exit(2)
+
+    with redirect_stdout(sys.stderr):
+        df, failed = reparse(args.date, args.history, args.processes)
+    if df is None:
+        emit("error", message="no archived pages, run scrape first")
+        sys.exit(1)
+    emit("done", rows=len(df), failed=failed, seconds=round(perf_counter() - start, 3))
+
+
+def run_serve(args):
+    server = QueryServer(args.host, args.port, args.reload)
+    data = server.data
+    emit(
+        "listening", url=server.url,
+        version=data.version if data else None, rows=len(data.df) if data else 0,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+# weight of format "column=weight", e.g. "P/E Ratio=-0.5"
+def parse_weight(text: str) -> tuple:
+    column, _, weight = text.rpartition("=")
+    if not column.strip():
+        raise ValueError(f"Invalid weight: {text}")
+    return column.strip(), float(weight)
+
+
+def run_screen(args):
+    start = perf_counter()
+    try:
+        criteria = [parse_criterion(text) for text in args.criteria]
+        if args.screen:
+            if args.screen not in (screens := load_screens()):
+                raise ValueError(f"no saved screen {args.screen}, saved: {sorted(screens)}")
+            criteria = screens[args.screen] + criteria
+        if args.date:
+            datetime.strptime(args.date, "%Y-%m-%d")
+        weights = dict(parse_weight(text) for text in args.weights)
+    except ValueError as error:
+        emit("error", message=str(error))
+        sys.exit(2)
+
+    if args.save:
+        save_screen(args.save, criteria)
+
+    if args.date:
+        detail_df = get_history().snapshot(args.date)
+    else:
+        detail_df = get_store().load()
+    if detail_df is None:
+        emit("error", message="no saved data, run scrape first")
+        sys.exit(1)
+
+    loaded = perf_counter()
+    try:
+        if args.top is not None or weights:
+            result = rank(detail_df, args.top, weights, criteria)
+        else:
+            result = filter(detail_df, criteria)
+    except KeyError as error:
+        emit("error", message=f"unknown column: {error.args[0]}")
+        sys.exit(2)
+    except ValueError as error:  # e.g. a text value against a number column
+        emit("error", message=str(error))
+        sys.exit(2)
+    screened = perf_counter()
+
+    if not args.out:
+        print(widen(result).to_json(orient="records"))
+    elif args.out.endswith(".parquet"):
+        result.to_parquet(args.out, index=False)
+    elif args.out.endswith(".csv"):
+        result.to_csv(args.out, index=False)
+    else:
+        widen(result).to_json(args.out, orient="records")
+
+    emit(
+        "done", sys.stderr if not args.out else None,
+        rows=len(result),
+        load_seconds=round(loaded - start, 3),
+        screen_seconds=round(screened - loaded, 3),
+        out=args.out,
+    )
 
-def main():
-    gui = MyGUI()
-    
-# get path to the program directory
+# folder of the saved data: $FUNDY_HOME or the program directory
 def get_path():
-    return os.path.dirname(os.path.realpath(__file__))
+    return os.environ.get("FUNDY_HOME") or os.path.dirname(os.path.realpath(__file__))
 
 
 # check if df is valid detail df
@@ -39,42 +393,320 @@ def is_valid_df(df: pd.DataFrame):
     return all([(col in list(df.columns.values)) for col in cols])
 
 
-# filter df using criteria dictionary
-def filter(df: pd.DataFrame, criteria: dict):
-    
-    # converting applicable columns to float
-    for col in list(df.keys()):
+# comparison operators allowed in screening criteria
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# columns returned by filter, key: column in detail df, value: displayed name
+RESULT_COLUMNS = {
+    "Symbol": "Symbol",
+    "Sector": "Sector",
+    "Market Price": "Market Price",
+    "Book Value": "Book Value",
+    "PBV": "PBV",
+    "EPS": "EPS",
+    "P/E Ratio": "P/E Ratio",
+    "avg_dvnd_rate": "avg_dvnd_rate",
+    "avg_dvnd_prob": "avg_dvnd_prob",
+    "avg_bonus_rate": "avg_bonus_rate",
+    "avg_bonus_prob": "avg_bonus_prob",
+    "1 Year Yield": "1 Year Yield",
+    "year_delta": "year delta",
+}
+
+
+# parse a condition of format "< 5", ">=1.5" or "== 'Hydro Power'" into (op, value)
+def parse_condition(condition: str):
+    matches = re.fullmatch(r"\s*(<=|>=|==|!=|<|>|=)\s*(.+?)\s*", condition)
+    if not matches:
+        raise ValueError(f"Invalid condition: {condition}")
+
+    op, value = matches.groups()
+    if value[0] == value[-1] and value[0] in "'\"" and len(value) > 1:
+        value = value[1:-1]
+    else:
+        value = float(value)
+
+    return ("==" if op == "=" else op), value
+
+
+# criteria dict of conditions or list of (column, op, value) into a list of (column, op, value)
+def compile_criteria(criteria) -> list:
+    if isinstance(criteria, dict):
+        criteria = [(column, *parse_condition(condition)) for column, condition in criteria.items()]
+
+    compiled = []
+    for column, op, value in criteria:
+        if op not in OPERATORS:
+            raise ValueError(f"Invalid operator: {op}")
+        compiled.append((column, op, value))
+    return compiled
+
+
+# copy of df with every numeric column (thousands separators allowed) as float
+def coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
         try:
-            df[col] = df[col].astype(float)
-        except ValueError:
+            df[col] = pd.to_numeric(df[col]).astype(float)
+            continue
+        except (ValueError, TypeError):
+            pass
+
+        # prices like "1,234.00", the first value is checked so text columns fail fast
+        try:
+            float(str(df[col].dropna().iloc[0]).replace(",", ""))
+            df[col] = pd.to_numeric(
+                df[col].map(lambda x: x.replace(",", "") if isinstance(x, str) else x)
+            ).astype(float)
+        except (ValueError, TypeError, IndexError):
             pass
+    return df
+
+
+# text columns of the details, every other column is a metric
+TEXT_COLUMNS = ["Symbol", "Sector", "scrape_date", "fundamentals_date"]
+CATEGORY_COLUMNS = ["Symbol", "Sector"]
+
 
-    # applying criteria
-    for column, condition in criteria.items():
-        df = df.query(f"`{column}` {condition}")
-
-    # curate dataframe
-    filtered = pd.DataFrame()
-    filtered["Symbol"] = df["Symbol"]
-    filtered["Sector"] = df["Sector"]
-    filtered["Market Price"] = df["Market Price"]
-    filtered["Book Value"] = df["Book Value"]
-    filtered["PBV"] = df["PBV"]
-    filtered["EPS"] = df["EPS"]
-    filtered["P/E Ratio"] = df["P/E Ratio"]
-    filtered["avg_dvnd_rate"] = df["avg_dvnd_rate"]
-    filtered["avg_dvnd_prob"] = df["avg_dvnd_prob"]
-    filtered["avg_bonus_rate"] = df["avg_bonus_rate"]
-    filtered["avg_bonus_prob"] = df["avg_bonus_prob"]
-    filtered["1 Year Yield"] = df["1 Year Yield"]
-    filtered["year delta"] = df["year_delta"]
-
-    return filtered
+# canonical in-memory schema of the detail df: categorical Symbol and Sector, text dates, float32 metrics
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    df = coerce_numeric(df)
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif col not in TEXT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+    return df
+
+
+# float32 metrics as the float64 of their shortest text (1234.56, not 1234.5600585938), categories as text
+# before they are mixed with float64 values or written as json
+def widen(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == np.float32:
+            df[col] = df[col].astype(str).astype(float)
+        elif isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+# True if every value passing the criterion `new` also passes `old`
+def implies(new: tuple, old: tuple) -> bool:
+    (column, op, value), (old_column, old_op, old_value) = new, old
+    if column != old_column:
+        return False
+    try:
+        if op == "==":
+            return bool(OPERATORS[old_op](value, old_value))
+        if op in ("<", "<=") and old_op in ("<", "<="):
+            return value < old_value or (value == old_value and (op == "<" or old_op == "<="))
+        if op in (">", ">=") and old_op in (">", ">="):
+            return value > old_value or (value == old_value and (op == ">" or old_op == ">="))
+    except TypeError:
+        return False
+    return op == old_op and value == old_value
+
+
+# True if the rows passing `new` are a subset of the rows passing `old`
+def narrows(old: list, new: list) -> bool:
+    return all(any(implies(criterion, old_criterion) for criterion in new) for old_criterion in old)
+
+
+# screening engine, types are coerced once and criteria are evaluated as a single mask
+# results are memoized in `cache` (a ScreenCache) under `version` of the data if given
+class Screener:
+    def __init__(self, df: pd.DataFrame, cache=None, version=None):
+        # frames already typed (e.g. loaded in the schema of apply_schema) are used as they are, never modified
+        typed = all(df[col].dtype != object for col in df.columns if col not in TEXT_COLUMNS)
+        self.df = df if typed else coerce_numeric(df)
+        self.result = curate(self.df)  # rows of screens are taken from here
+        self.arrays = {}
+        self.last = None  # (criteria, positions) of the previous screen
+        self.cache = cache
+        self.version = version
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.arrays:
+            self.arrays[name] = self.df[name].to_numpy()
+        return self.arrays[name]
+
+    # text column as a pd.Categorical, categorical columns are used as they are
+    def categories(self, name: str) -> pd.Categorical:
+        key = ("codes", name)
+        if key not in self.arrays:
+            column = self.df[name]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                self.arrays[key] = column.array
+            else:
+                self.arrays[key] = pd.Categorical(column)
+        return self.arrays[key]
+
+    # text columns are compared as integer category codes, a value of the wrong type raises ValueError
+    def compare(self, column, op, value, positions=None) -> np.ndarray:
+        dtype = self.df[column].dtype
+        is_text = dtype == object or isinstance(dtype, pd.CategoricalDtype)
+        if is_text and op in ("==", "!=") and isinstance(value, str):
+            categories = self.categories(column)
+            array = categories.codes
+            value = categories.categories.get_indexer([value])[0]
+            if value == -1:  # not present, differs from every code including missing (-1)
+                value = -2
+        else:
+            array = self.column(column)
+
+        if positions is not None:
+            array = array[positions]
+        try:
+            return OPERATORS[op](array, value)
+        except TypeError:  # e.g. PBV < 'abc', or a number against a text column
+            raise ValueError(f"cannot compare {column} {op} {value!r}") from None
+
+    def mask(self, criteria) -> np.ndarray:
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, op, value in compile_criteria(criteria):
+            mask &= self.compare(column, op, value)
+        return mask
+
+    # row positions passing the criteria, a stricter screen only rechecks the previous result
+    def positions(self, criteria) -> np.ndarray:
+        criteria = compile_criteria(criteria)
+
+        if self.cache is not None and (positions := self.cache.get(self.version, criteria)) is not None:
+            self.last = (criteria, positions)
+            return positions
+
+        # read once, screens of other threads may replace it
+        last = self.last
+        if last and narrows(last[0], criteria):
+            positions = last[1]
+            mask = np.ones(len(positions), dtype=bool)
+            for column, op, value in criteria:
+                mask &= self.compare(column, op, value, positions)
+            positions = positions[mask]
+        else:
+            positions = np.flatnonzero(self.mask(criteria))
+
+        self.last = (criteria, positions)
+        if self.cache is not None:
+            self.cache.put(self.version, criteria, positions)
+        return positions
+
+    # screen every saved screen once so they come from the cache, screens of missing columns are skipped
+    def warm(self, screens):
+        for criteria in screens:
+            try:
+                self.positions(criteria)
+            except (KeyError, ValueError, TypeError) as error:
+                print(f"could not warm screen {criteria}: {error}")
+
+    def screen(self, criteria) -> pd.DataFrame:
+        return self.result.iloc[self.positions(criteria)]
+
+
+# curated dataframe of the result columns
+def curate(df: pd.DataFrame) -> pd.DataFrame:
+    return df[list(RESULT_COLUMNS)].rename(columns=RESULT_COLUMNS, copy=False)
+
+
+# filter df using criteria dictionary or list of (column, op, value), df is not modified
+def filter(df: pd.DataFrame, criteria):
+    return Screener(df).screen(criteria)
+
+
+# criteria in one order without duplicates and numbers as float, equal screens get equal keys
+def canonical_criteria(criteria) -> tuple:
+    canonical = set()
+    for column, op, value in compile_criteria(criteria):
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = float(value)
+        canonical.add((column, op, value))
+    return tuple(sorted(canonical, key=lambda criterion: (criterion[0], criterion[1], repr(criterion[2]))))
+
+
+# least recently used screen results (row positions) of one version of the data, at most `size` of them
+class ScreenCache:
+    def __init__(self, size=SCREEN_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = self.misses = 0
+
+    # positions of the criteria on `version` of the data, None if not cached
+    def get(self, version, criteria):
+        key = canonical_criteria(criteria)
+        with self.lock:
+            if version != self.version or key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+    def put(self, version, criteria, positions: np.ndarray):
+        key = canonical_criteria(criteria)
+        positions.flags.writeable = False  # shared by every screen hitting the entry
+        with self.lock:
+            # results of another version can never be used again
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            self.entries[key] = positions
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+
+
+screen_cache = ScreenCache()
+
+
+def screens_path():
+    return os.path.join(get_path(), "screens.json")
+
+
+# saved screens as {name: [(column, op, value), ...]}, empty if nothing is saved
+def load_screens() -> dict:
+    try:
+        with open(screens_path()) as file:
+            saved = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {name: [tuple(criterion) for criterion in criteria] for name, criteria in saved.items()}
+
+
+def save_screen(name: str, criteria):
+    screens = load_screens()
+    screens[name] = compile_criteria(criteria)
+    with open(screens_path(), "w") as file:
+        json.dump(screens, file)
+
+
+def delete_screen(name: str):
+    screens = load_screens()
+    if screens.pop(name, None) is not None:
+        with open(screens_path(), "w") as file:
+            json.dump(screens, file)
 
 
 # show popup window
 def show_popup(win=None, msg="Popup Message"):
-    
+    load_gui()
+
     # popup in new window, stops other tasks until destroyed
     if win == None:
         popup = tk.Tk()
@@ -91,31 +723,1335 @@ def show_popup(win=None, msg="Popup Message"):
         ttk.Button(top, text="Done", font="Helvetica", command=top.destroy).pack(padx=10, pady=10)
 
 
-# class for nepali share market
-class NEPSE:
+# thread-safe token bucket limiting the request rate across all workers
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    # blocks until a token is available and takes it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+
+# token bucket whose rate follows the site: additive increase while responses are quick,
+# multiplicative decrease (at most once a second) on 429/5xx, errors and slow responses
+class AdaptiveLimiter(TokenBucket):
+    def __init__(self, rate: float, capacity: int, min_rate=RATE_MIN, max_rate=RATE_MAX):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decreased = 0.0
+
+    def succeeded(self, latency: float):
+        if latency > SLOW_RESPONSE:
+            return self.throttled()
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + RATE_STEP)
+
+    def throttled(self):
+        with self.lock:
+            now = monotonic()
+            if now - self.decreased >= 1:
+                self.rate = max(self.min_rate, self.rate * RATE_BACKOFF)
+                self.decreased = now
+
+
+# shared by every fetch, replaces the fixed per-call sleep
+rate_limiter = AdaptiveLimiter(RATE_LIMIT, RATE_BURST)
+
+
+# raised by fetches once the circuit breaker opened `trips` times in a row
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+
+
+# stops every fetch for `cooldown` seconds after `threshold` consecutive failures,
+# after the pause one more failure opens it again, `trips` pauses in a row stop the run
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, trips=BREAKER_TRIPS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.trips = trips
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = 0  # pauses since the last success
+            self.opened_until = 0.0
+
+    # blocks while the breaker is open
+    def wait(self):
+        while True:
+            if self.opened >= self.trips:
+                raise CircuitOpenError(f"merolagani failed {self.opened} times in a row after pausing, stopping")
+            if (remaining := self.opened_until - monotonic()) <= 0:
+                return
+            sleep(min(remaining, 0.5))
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = 0
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_until <= monotonic():
+                self.opened_until = monotonic() + self.cooldown
+                self.failures = self.threshold - 1
+                self.opened += 1
+                metrics.count("breaker_opened")
+                if self.opened < self.trips:
+                    print(f"merolagani keeps failing, pausing downloads for {self.cooldown:.0f}s")
+
+
+breaker = CircuitBreaker()
+
+# responses worth retrying
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+
+# full-jitter exponential backoff, at least the Retry-After the server asked for
+def backoff(attempt: int, response=None) -> float:
+    delay = random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2**attempt))
+    try:
+        delay = max(delay, min(RETRY_CAP, float(response.headers["Retry-After"])))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        pass
+    return delay
+
+
+# 429/5xx responses, connection errors and timeouts
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in TRANSIENT_STATUS
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+# shared keep-alive session used by every fetch
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+# on-disk store of ETag/Last-Modified validators and the last body of each page
+class PageCache:
+    def __init__(self, folder=None):
+        self.folder = folder if folder else os.path.join(get_path(), "cache")
+
+    def paths(self, url: str):
+        key = os.path.join(self.folder, sha1(url.encode()).hexdigest())
+        return f"{key}.html", f"{key}.json"
+
+    # headers that turn the request into a conditional one, empty if nothing is cached
+    def conditional_headers(self, url: str) -> dict:
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path) as file:
+                validators = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        if not os.path.exists(body_path):
+            return {}
+
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def load(self, url: str) -> str:
+        with open(self.paths(url)[0], encoding="utf-8") as file:
+            return file.read()
+
+    def save(self, url: str, response: requests.Response):
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        # pages without validators can never come back as 304
+        if not any(validators.values()):
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+        body_path, meta_path = self.paths(url)
+        with open(body_path, "w", encoding="utf-8") as file:
+            file.write(response.text)
+        with open(meta_path, "w") as file:
+            json.dump(validators, file)
+
+
+page_cache = PageCache()
+
+
+# every fetched CompanyList and CompanyDetail page, gzip compressed and stored once per content hash in
+# archive/objects/ab/cdef...html.gz, indexed by kind, symbol and scrape date in archive/index.db
+class PageArchive:
+    def __init__(self, folder=None):
+        self.folder = folder if folder else os.path.join(get_path(), "archive")
+        os.makedirs(self.folder, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(self.folder, "index.db"), check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "kind TEXT, symbol TEXT, scrape_date TEXT, hash TEXT, "
+                "PRIMARY KEY (kind, symbol, scrape_date))"
+            )
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.folder, "objects", digest[:2], f"{digest[2:]}.html.gz")
+
+    # archive the page of a symbol on a scrape date (default: today's), identical pages are written once
+    def put(self, kind: str, symbol: str, page: str, scrape_date=None) -> str:
+        body = page.encode("utf-8")
+        digest = sha1(body).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as file:
+                file.write(gzip.compress(body))
+            os.replace(temp, path)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (kind, symbol, scrape_date, hash) VALUES (?, ?, ?, ?)",
+                (kind, symbol, scrape_date if scrape_date else scrape_day(), digest),
+            )
+        return digest
+
+    def get(self, digest: str) -> str:
+        return read_archived(self.path(digest))
+
+    # (symbol, scrape_date, hash) of every archived page of a kind up to `until`, by date
+    def pages(self, kind: str, until=None) -> list:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT symbol, scrape_date, hash FROM pages WHERE kind = ? AND scrape_date <= ? "
+                "ORDER BY scrape_date, symbol",
+                (kind, until if until else "9999-12-31"),
+            ).fetchall()
+
+    # like pages, only the latest page of every symbol
+    def latest(self, kind: str, until=None) -> list:
+        with self.lock:
+            # sqlite takes the other columns from the row of the MAX
+            return self.connection.execute(
+                "SELECT symbol, MAX(scrape_date), hash FROM pages WHERE kind = ? AND scrape_date <= ? "
+                "GROUP BY symbol ORDER BY 2, symbol",
+                (kind, until if until else "9999-12-31"),
+            ).fetchall()
+
+
+# page of an archive file, module level so parsing processes read the archive themselves
+def read_archived(path: str) -> str:
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return file.read()
+
+
+# parse_company of an archived page, None if it can not be read or parsed
+def reparse_page(path: str, symbol: str, scrape_date: str):
+    try:
+        return parse_company(symbol, read_archived(path), scrape_date)
+    except (OSError, ValueError) as error:
+        print(f"could not parse the page of {symbol} from {scrape_date}: {error}")
+        return None
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> PageArchive:
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive()
+        return _archive
+
+
+# timing spans of the scrape stages (throttle, fetch, archive, parse, transform, merge, persist) per symbol and run,
+# with latency histograms per stage and event counters
+class Metrics:
+    def __init__(self, buckets=METRIC_BUCKETS, names=SCRAPE_METRIC_NAMES):
+        self.buckets = buckets
+        self.names = names
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.spans = deque(maxlen=METRIC_SPANS)  # (run, stage, symbol, seconds)
+            self.histograms = {}  # stage: [count per bucket..., count above the last, sum]
+            self.counters = {}
+            self.runs = []  # {"run", "started", "seconds", "counters"}
+            self.run = 0
+
+    # spans and counters recorded until finish_run belong to a new run
+    def start_run(self) -> int:
+        with self.lock:
+            self.run += 1
+            self.runs.append(
+                {"run": self.run, "started": datetime.now().isoformat(timespec="seconds"),
+                 "seconds": None, "counters": {}, "start": perf_counter()}
+            )
+            return self.run
+
+    def finish_run(self):
+        with self.lock:
+            if self.runs and self.runs[-1]["seconds"] is None:
+                self.runs[-1]["seconds"] = perf_counter() - self.runs[-1].pop("start")
+
+    def record(self, stage: str, seconds: float, symbol=None):
+        with self.lock:
+            self.spans.append((self.run, stage, symbol, seconds))
+            histogram = self.histograms.setdefault(stage, [0] * (len(self.buckets) + 2))
+            histogram[np.searchsorted(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def span(self, stage: str, symbol=None):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, perf_counter() - start, symbol)
+
+    def count(self, event: str, n=1):
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+            if self.runs and self.runs[-1]["seconds"] is None:
+                counters = self.runs[-1]["counters"]
+                counters[event] = counters.get(event, 0) + n
+
+    # count, total, mean, p50, p95 and max seconds of every stage, of one run or of all
+    def summary(self, run=None) -> dict:
+        with self.lock:
+            spans = [span for span in self.spans if run is None or span[0] == run]
+        df = pd.DataFrame(spans, columns=["run", "stage", "symbol", "seconds"])
+        summary = df.groupby("stage")["seconds"].agg(
+            count="size", total="sum", mean="mean",
+            p50=lambda x: x.quantile(0.5), p95=lambda x: x.quantile(0.95), max="max",
+        )
+        return summary.round(6).to_dict("index")
+
+    # seconds of every stage of every symbol
+    def by_symbol(self, run=None) -> dict:
+        with self.lock:
+            spans = [span for span in self.spans if span[2] is not None and (run is None or span[0] == run)]
+        symbols = {}
+        for _, stage, symbol, seconds in spans:
+            stages = symbols.setdefault(symbol, {})
+            stages[stage] = round(stages.get(stage, 0) + seconds, 6)
+        return symbols
+
+    def to_json(self) -> dict:
+        with self.lock:
+            runs = [{key: value for key, value in run.items() if key != "start"} for run in self.runs]
+            histograms = {
+                stage: {
+                    "buckets": dict(zip([*map(str, self.buckets), "+Inf"], np.cumsum(counts[:-1]).tolist())),
+                    "sum": round(counts[-1], 6),
+                    "count": int(sum(counts[:-1])),
+                }
+                for stage, counts in self.histograms.items()
+            }
+            counters = dict(self.counters)
+        return {
+            "runs": runs,
+            "counters": counters,
+            "stages": self.summary(),
+            "histograms": histograms,
+            "symbols": self.by_symbol(),
+        }
+
+    # prometheus text exposition format, named by `names`
+    def to_prometheus(self) -> str:
+        data = self.to_json()
+        name, label, description = self.names["seconds"]
+        lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for stage, histogram in data["histograms"].items():
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{name}_bucket{{{label}="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{{label}="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{{label}="{stage}"}} {histogram["count"]}')
+
+        name, label, description = self.names["events"]
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        for event, count in sorted(data["counters"].items()):
+            lines.append(f'{name}{{{label}="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    # writes path as json and the same name with .prom as prometheus text, default: metrics.json
+    def export(self, path=None):
+        path = path if path else os.path.join(get_path(), "metrics.json")
+        with open(path, "w") as file:
+            json.dump(self.to_json(), file, indent=2)
+        with open(os.path.splitext(path)[0] + ".prom", "w") as file:
+            file.write(self.to_prometheus())
+
+
+# shared by the whole scrape pipeline
+metrics = Metrics()
+
+
+# cProfile of one run, in the calling thread and in every download thread
+class RunProfiler:
     def __init__(self):
-        self.companies ={}
-        
-        # getting the company_list webpage (source: Merolagani)
-        headers = {
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36 Edg/108.0.1462.54",
-            "referer": "https://www.google.com/",
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    # profile the current thread while the block runs
+    @contextmanager
+    def profile(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                self.profiles.append(profile)
+
+    def stats(self, stream=None) -> pstats.Stats:
+        with self.lock:
+            stats = pstats.Stats(*self.profiles, stream=stream)
+        return stats.sort_stats("cumulative")
+
+    # saves the merged profile for `python -m pstats path` or snakeviz
+    def dump(self, path: str):
+        self.stats().dump_stats(path)
+
+
+# get a page through the shared session, unchanged pages are served from page_cache
+# transient failures are retried RETRIES times, then raised
+def fetch_page(url: str, symbol=None) -> str:
+    for attempt in range(RETRIES + 1):
+        breaker.wait()
+        with metrics.span("throttle", symbol):
+            rate_limiter.acquire()
+
+        start, response = perf_counter(), None
+        try:
+            with metrics.span("fetch", symbol):
+                response = get_session().get(
+                    url, headers=page_cache.conditional_headers(url), timeout=TIMEOUT
+                )
+            if response.status_code not in TRANSIENT_STATUS:
+                rate_limiter.succeeded(perf_counter() - start)
+                breaker.succeeded()
+                break
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            if not is_transient(error):
+                raise
+            rate_limiter.throttled()
+            breaker.failed()
+            if attempt == RETRIES:
+                raise
+            metrics.count("retries")
+            sleep(backoff(attempt, response))
+
+    if response.status_code == 304:
+        metrics.count("not_modified")
+        return page_cache.load(url)
+
+    response.raise_for_status()
+    metrics.count("fetched")
+    page_cache.save(url, response)
+    return response.text
+
+
+# per-symbol store of company details, every record is committed as soon as it arrives
+class DataStore:
+    def __init__(self, path=None):
+        self.path = path if path else os.path.join(get_path(), "data.db")
+        self.arrow_path = os.path.splitext(self.path)[0] + ".arrow"
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            # WAL keeps committed records safe if the app dies mid-download
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS details ("
+                "symbol TEXT PRIMARY KEY, scrape_date TEXT, record TEXT)"
+            )
+            # downloaded companies waiting for their dividends and bonus to be described with a batch
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS staged ("
+                "symbol TEXT PRIMARY KEY, record TEXT, benefits TEXT)"
+            )
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM details LIMIT 1").fetchone() is None
+
+    # insert or replace the details of one company
+    def upsert(self, details: dict):
+        self.upsert_many([details])
+
+    # `staged`: symbols taken off the staging table in the same transaction
+    def upsert_many(self, records: list, staged=()):
+        rows = [
+            (details["Symbol"], details["scrape_date"], json.dumps(details))
+            for details in records
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO details (symbol, scrape_date, record) VALUES (?, ?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET "
+                "scrape_date = excluded.scrape_date, record = excluded.record",
+                rows,
+            )
+            self.connection.executemany("DELETE FROM staged WHERE symbol = ?", [(symbol,) for symbol in staged])
+            # every write makes the arrow snapshot stale
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            self.connection.execute(f"PRAGMA user_version = {version + 1}")
+
+    # commit the details and raw benefit rows of one downloaded company before they are described
+    # staged companies are not part of load() until upsert_many saves them
+    def stage(self, details: dict, benefits: list):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO staged (symbol, record, benefits) VALUES (?, ?, ?)",
+                (details["Symbol"], json.dumps(details), json.dumps(benefits)),
+            )
+
+    # (details records, benefit rows) of every staged company
+    def staged(self) -> tuple:
+        with self.lock:
+            rows = self.connection.execute("SELECT record, benefits FROM staged").fetchall()
+        records, benefits = [], []
+        for record, company_benefits in rows:
+            records.append(json.loads(record))
+            benefits.extend(json.loads(company_benefits))
+        return records, benefits
+
+    def version(self) -> int:
+        with self.lock:
+            return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    # all stored details in the schema of apply_schema, None if nothing is stored
+    # read from the memory-mapped arrow snapshot (data.arrow) unless the store changed since it was written
+    def load(self):
+        version = self.version()
+        if (df := self.load_arrow(version)) is not None:
+            return df
+
+        with self.lock:
+            rows = self.connection.execute("SELECT record FROM details").fetchall()
+        if not rows:
+            return None
+        df = coerce_numeric(pd.DataFrame([json.loads(record) for (record,) in rows]))
+        # records saved before the derived metrics existed
+        if set(DERIVED_COLUMNS) - set(df.columns) or df[DERIVED_COLUMNS].isna().all(axis=1).any():
+            df = derive_metrics(df)
+        df = apply_schema(df)
+        self.save_arrow(df, version)
+        return df
+
+    def load_arrow(self, version: int):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        try:
+            table = ipc.open_file(pa.memory_map(self.arrow_path)).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        if (table.schema.metadata or {}).get(b"store_version") != str(version).encode():
+            return None
+        return table.to_pandas()
+
+    # uncompressed arrow IPC file tagged with the store version, written next to it and renamed
+    def save_arrow(self, df: pd.DataFrame, version: int):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), b"store_version": str(version).encode()}
+        )
+        temp = self.arrow_path + ".tmp"
+        try:
+            with ipc.new_file(temp, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(temp, self.arrow_path)
+        except OSError as error:
+            # e.g. the old snapshot is still mapped on windows, the next load tries again
+            print(f"could not save {self.arrow_path}: {error}")
+
+    def import_csv(self, path: str):
+        df = pd.read_csv(path)
+        if not is_valid_df(df):
+            return
+        self.upsert_many(json.loads(df.to_json(orient="records")))
+
+    def export_csv(self, path=None):
+        if (df := self.load()) is None:
+            return
+        df.set_index("Symbol").to_csv(path if path else os.path.join(get_path(), "data.csv"))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# shared data store, seeded from an existing data.csv on first use
+def get_store() -> DataStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DataStore()
+            csv_path = os.path.join(get_path(), "data.csv")
+            if _store.is_empty() and os.path.exists(csv_path):
+                _store.import_csv(csv_path)
+        return _store
+
+
+# every scrape kept as a dated snapshot, one zstd parquet partition per scrape date:
+# history/scrape_date=YYYY-MM-DD/part-0.parquet
+class HistoryStore:
+    def __init__(self, folder=None):
+        self.folder = folder if folder else os.path.join(get_path(), "history")
+        self.lock = threading.Lock()
+
+    def partition(self, date: str) -> str:
+        return os.path.join(self.folder, f"scrape_date={date}", "part-0.parquet")
+
+    # snapshot dates in ascending order, read from the folder names only
+    def dates(self) -> list:
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(
+            name.split("=", 1)[1]
+            for name in os.listdir(self.folder)
+            if name.startswith("scrape_date=") and os.path.exists(os.path.join(self.folder, name, "part-0.parquet"))
+        )
+
+    def is_empty(self) -> bool:
+        return not self.dates()
+
+    # add records (dicts or a dataframe) to their scrape date partitions, other dates are not touched
+    # a symbol scraped again on the same date replaces its row
+    def append(self, records):
+        df = widen(records) if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        if df.empty:
+            return
+
+        df = coerce_numeric(df)
+        for col in df.columns.difference(TEXT_COLUMNS):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+
+        with self.lock:
+            for date, part in df.groupby("scrape_date", sort=False):
+                path = self.partition(date)
+                part = part.drop(columns="scrape_date")
+                if os.path.exists(path):
+                    part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+                    part = part.drop_duplicates("Symbol", keep="last")
+                part = part.sort_values("Symbol", kind="stable")
+
+                # written next to the partition and renamed, readers never see half a file
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp = os.path.join(os.path.dirname(path), ".part-0.parquet")
+                part.to_parquet(temp, index=False, compression="zstd")
+                os.replace(temp, path)
+
+    # pyarrow dataset of all partitions, filters on scrape_date only open the matching folders
+    def dataset(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        partitioning = ds.partitioning(pa.schema([("scrape_date", pa.string())]), flavor="hive")
+        dataset = ds.dataset(self.folder, format="parquet", partitioning=partitioning)
+
+        # columns added since the first partition come from the latest one, older ones read them as missing
+        fragments = sorted(dataset.get_fragments(), key=lambda fragment: fragment.path)
+        schema = pa.unify_schemas(
+            [fragments[0].physical_schema, fragments[-1].physical_schema, pa.schema([("scrape_date", pa.string())])]
+        )
+        return ds.dataset(self.folder, schema=schema, format="parquet", partitioning=partitioning)
+
+    # only the given columns and rows matching the pyarrow expression are read
+    def query(self, columns=None, since=None, until=None, symbols=None) -> pd.DataFrame:
+        import pyarrow.dataset as ds
+
+        if self.is_empty():
+            return pd.DataFrame(columns=columns)
+
+        conditions = []
+        if since is not None:
+            conditions.append(ds.field("scrape_date") >= str(since))
+        if until is not None:
+            conditions.append(ds.field("scrape_date") <= str(until))
+        if symbols is not None:
+            conditions.append(ds.field("Symbol").isin(list(symbols)))
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return self.dataset().to_table(columns=columns, filter=expression).to_pandas()
+
+    # details of every symbol as of a date (default: latest): its last scrape on or before the date,
+    # looking back at most HISTORY_LOOKBACK days. None if nothing was scraped by then
+    def snapshot(self, date=None, columns=None) -> pd.DataFrame:
+        dates = [d for d in self.dates() if date is None or d <= str(date)]
+        if not dates:
+            return None
+
+        since = datetime.strptime(dates[-1], "%Y-%m-%d").date() - timedelta(days=HISTORY_LOOKBACK)
+        if columns is not None:
+            columns = list(dict.fromkeys(["Symbol", *columns, "scrape_date"]))
+        df = self.query(columns, since=since, until=dates[-1])
+        df = df.sort_values("scrape_date", kind="stable").drop_duplicates("Symbol", keep="last")
+        return df.sort_values("Symbol").reset_index(drop=True)
+
+    # column of one symbol indexed by scrape date, e.g. series("NABIL", "P/E Ratio", since="2024-01-01")
+    def series(self, symbol: str, column: str, since=None, until=None) -> pd.Series:
+        df = self.query(["scrape_date", column], since, until, symbols=[symbol])
+        df.index = pd.to_datetime(df.pop("scrape_date"))
+        return df[column].sort_index()
+
+    # column of every symbol as of `since` and `until` (default: latest) and its fractional change,
+    # e.g. changed["change"] < -0.2 for a drop of more than 20%
+    def change(self, column: str, since, until=None) -> pd.DataFrame:
+        before, after = self.snapshot(since, [column]), self.snapshot(until, [column])
+        if before is None or after is None:
+            return pd.DataFrame(columns=["before", "after", "change"])
+
+        df = pd.DataFrame(
+            {"before": before.set_index("Symbol")[column], "after": after.set_index("Symbol")[column]}
+        ).dropna()
+        df["change"] = (df["after"] - df["before"]) / df["before"].abs()
+        return df
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+# shared history, seeded from the data store on first use
+def get_history() -> HistoryStore:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = HistoryStore()
+            if _history.is_empty() and (df := get_store().load()) is not None:
+                _history.append(df)
+        return _history
+
+
+# raised when a merolagani page no longer has the expected tables
+class PageLayoutError(ValueError):
+    pass
+
+
+# labels of the company detail table used by Company
+DETAIL_LABELS = [
+    "Market Price",
+    "% Change",
+    "Last Traded On",
+    "52 Weeks High - Low",
+    "1 Year Yield",
+    "EPS",
+    "P/E Ratio",
+    "Book Value",
+    "PBV",
+]
+BENEFIT_HEADERS = ["Fiscal Year", "Value"]
+
+# numbers with thousands separators, as recognised by pd.read_html
+NUMBER = re.compile(r"^[\-\+]?([0-9]+,|[0-9])*(\.[0-9]*)?([0-9]?(E|e)\-?[0-9]+)?$")
+WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+
+# cell text cleaned the same way pd.read_html does it
+def cell_text(cell) -> str:
+    text = WHITESPACE.sub(" ", cell.text_content().strip())
+    if "," in text and NUMBER.search(text):
+        return text.replace(",", "")
+    return text
+
+
+def is_hidden(element) -> bool:
+    return "display:none" in element.get("style", "").replace(" ", "")
+
+
+# cells of a row with colspans expanded
+def row_cells(row) -> list:
+    cells = []
+    for cell in row:
+        if cell.tag in ("td", "th"):
+            cells.extend([cell] * int(cell.get("colspan", 1) or 1))
+    return cells
+
+
+# header and records of a small table, rows of all <th> on top are the header
+def table_records(table) -> tuple:
+    rows = table.xpath(".//thead/tr")
+    header = [cell_text(cell) for row in rows for cell in row_cells(row)]
+    body = table.xpath(".//tbody//tr|./tr")
+
+    while not header and body and all(cell.tag == "th" for cell in row_cells(body[0])):
+        header = [cell_text(cell) for cell in row_cells(body.pop(0))]
+
+    records = [dict(zip(header, map(cell_text, row_cells(row)))) for row in body]
+    return header, [record for record in records if record]
+
+
+# parse the CompanyDetail page into plain records
+# returns {"details": [(label, value), ...], "dividends": [row, ...], "bonus": [row, ...]}
+def parse_company_page(page: str) -> dict:
+    document = lxml_html.fromstring(page)
+
+    # first four visible tables with text: details, dividends, bonus, right shares
+    tables = []
+    for table in document.iter("table"):
+        if is_hidden(table) or not table.text_content():
+            continue
+        tables.append(table)
+        if len(tables) == 4:
+            break
+    if len(tables) < 4:
+        raise PageLayoutError(f"expected 4 tables, found {len(tables)}")
+
+    for table in tables[:3]:
+        for element in table.xpath(".//*[@style]"):
+            if is_hidden(element):
+                element.getparent().remove(element)
+        for br in table.iter("br"):
+            br.tail = "\n" + (br.tail or "")
+
+    # only the first 12 rows of the detail table are organized
+    details = []
+    for row in tables[0].xpath(".//tbody//tr|./tr")[:12]:
+        cells = row_cells(row)
+        if len(cells) >= 2:
+            details.append((cell_text(cells[0]), cell_text(cells[1])))
+
+    if missing := set(DETAIL_LABELS) - {label for label, _ in details}:
+        raise PageLayoutError(f"detail table is missing {sorted(missing)}")
+
+    benefits = []
+    for name, table in zip(["dividend", "bonus"], tables[1:3]):
+        header, records = table_records(table)
+        if missing := set(BENEFIT_HEADERS) - set(header):
+            raise PageLayoutError(f"{name} table is missing columns {sorted(missing)}")
+        benefits.append(records)
+
+    return {"details": details, "dividends": benefits[0], "bonus": benefits[1]}
+
+
+# details, (Symbol, kind, year, value) benefit rows and parse/transform seconds of a company page
+# avg_* columns are left to add_benefits, module level so a ProcessPoolExecutor can run it
+def parse_company(smbl: str, page: str, scrape_date: str) -> tuple:
+    start = perf_counter()
+    tables = parse_company_page(page)
+    parsed = perf_counter()
+
+    # setting the details
+    details = dict(tables["details"])
+    details["1 Year Yield"] = details["1 Year Yield"].strip("%")
+    details["Symbol"] = smbl
+    details["EPS"] = float(details["EPS"].split()[0])
+    [details["year_high"], details["year_low"]] = details["52 Weeks High - Low"].replace(",", "").split("-")
+
+    del details["Last Traded On"]
+    del details["52 Weeks High - Low"]
+    del details["% Change"]
+
+    for key, value in details.items():
+        try:
+            details[key] = float(value)
+        except ValueError:
+            pass
+
+    details["year_delta"] = details["year_high"] - details["year_low"]
+    details["scrape_date"] = scrape_date
+    details["fundamentals_date"] = scrape_date
+
+    # the site labels the dividend columns the other way round
+    benefits = [
+        (smbl, "dvnd", row["Value"], row["Fiscal Year"]) for row in tables["dividends"]
+    ] + [
+        (smbl, "bonus", row["Fiscal Year"], row["Value"]) for row in tables["bonus"]
+    ]
+    return details, benefits, {"parse": parsed - start, "transform": perf_counter() - parsed}
+
+
+# columns of the LatestMarket table used for the price refresh
+MARKET_HEADERS = ["Symbol", "LTP", "High", "Low"]
+
+
+# parse the LatestMarket page into a dataframe of last traded price, day high and low indexed by Symbol
+# only symbols traded in the last session are listed
+def parse_market_page(page: str) -> pd.DataFrame:
+    document = lxml_html.fromstring(page)
+    for table in document.iter("table"):
+        header, records = table_records(table)
+        if not set(MARKET_HEADERS) - set(header):
+            break
+    else:
+        raise PageLayoutError(f"no table with columns {MARKET_HEADERS}")
+
+    df = pd.DataFrame(records, columns=header)[MARKET_HEADERS]
+    df[MARKET_HEADERS[1:]] = df[MARKET_HEADERS[1:]].apply(pd.to_numeric, errors="coerce")
+    return df.dropna().drop_duplicates("Symbol").set_index("Symbol")
+
+
+# stored details with the fast-moving fields recomputed from the market page, untraded symbols keep their price
+# the 52 week range is widened by the day's range until the next detail download corrects it
+def apply_prices(df: pd.DataFrame, market: pd.DataFrame) -> pd.DataFrame:
+    df = coerce_numeric(df.set_index("Symbol"))
+    prices = market.reindex(df.index)
+    traded = prices["LTP"].notna()
+
+    price = prices["LTP"].where(traded, df["Market Price"])
+    df["Market Price"] = price
+    df["year_high"] = np.fmax(df["year_high"], prices["High"])
+    df["year_low"] = np.fmin(df["year_low"], prices["Low"])
+    df["year_delta"] = df["year_high"] - df["year_low"]
+    df["PBV"] = (price / df["Book Value"]).round(2).where(traded, df["PBV"])
+    df["P/E Ratio"] = (price / df["EPS"]).round(2).where(traded & (df["EPS"] != 0), df["P/E Ratio"])
+
+    if "fundamentals_date" not in df:
+        df["fundamentals_date"] = df["scrape_date"]
+    df["fundamentals_date"] = df["fundamentals_date"].fillna(df["scrape_date"])
+    df["scrape_date"] = scrape_day()
+    return derive_metrics(df.reset_index())
+
+
+# parse the CompanyList page into {sector: [symbols]}
+def parse_company_list(page: str) -> dict:
+    from bs4 import BeautifulSoup
+
+    companies = {}
+    soup = BeautifulSoup(page, features="lxml")
+    for sectorRow in soup.find_all(attrs ={"class":"panel-default"}):
+        sector = sectorRow.find('a').get_text().strip()
+        try:
+            companyRows = sectorRow.find_all("tr")[1:]
+        except TypeError:
+            print("error in finding sectors")
+            continue
+        companies[sector] = [row.find('a').get_text().strip() for row in companyRows]
+    return companies
+
+
+def companies_path():
+    return os.path.join(get_path(), "companies.json")
+
+
+# download the company list and save it for the next startup
+def download_companies() -> dict:
+    page = fetch_page(f"{BASE_URL}/CompanyList.aspx")
+    with metrics.span("archive"):
+        get_archive().put("CompanyList", "", page)
+    with metrics.span("parse"):
+        companies = parse_company_list(page)
+    with open(companies_path(), "w") as file:
+        json.dump({"fetched_at": datetime.now().timestamp(), "companies": companies}, file)
+    return companies
+
+
+# saved company list and its age in seconds, (None, None) if nothing is saved
+def load_companies():
+    try:
+        with open(companies_path()) as file:
+            saved = json.load(file)
+        return saved["companies"], datetime.now().timestamp() - saved["fetched_at"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None, None
+
+
+# rebuild the store from the latest archived page of every symbol up to `until`, and with `history` every
+# history snapshot from the pages of its date, without the network
+# pages are parsed on `processes` processes (0: in this one), returns everything stored and the symbols that failed
+def reparse(until=None, history=False, processes=PARSE_PROCESSES):
+    archive = get_archive()
+    rows = archive.pages("CompanyDetail", until) if history else archive.latest("CompanyDetail", until)
+    if not rows:
+        return None, []
+    jobs = [(archive.path(digest), symbol, scrape_date) for symbol, scrape_date, digest in rows]
+
+    latest, failed = {}, []
+    with (
+        ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        if processes else nullcontext()
+    ) as executor:
+        results = executor.map(reparse_page, *zip(*jobs), chunksize=16) if executor else map(reparse_page, *zip(*jobs))
+
+        # jobs are sorted by date, the pages of a date are described and saved together
+        for scrape_date, day in groupby(zip(jobs, results), key=lambda item: item[0][2]):
+            records, benefits = [], []
+            for (_, symbol, _), parsed in day:
+                if parsed is None:
+                    failed.append(symbol)
+                    continue
+                details, symbol_benefits, _ = parsed
+                records.append(details)
+                benefits.extend(symbol_benefits)
+
+            described = add_derived(add_benefits(records, benefits))
+            kept = {details["Symbol"] for details in described}
+            failed.extend(details["Symbol"] for details in records if details["Symbol"] not in kept)
+            if history:
+                get_history().append(described)
+            latest.update((details["Symbol"], details) for details in described)
+
+    store = get_store()
+    store.upsert_many(keep_newer(list(latest.values()), store.load()))
+    store.export_csv()
+    return store.load(), failed
+
+
+# reparsed records that do not take the stored data back in time: a company whose stored fundamentals are newer
+# than its archived page is left out, one whose price was refreshed since keeps that price and scrape_date
+def keep_newer(records: list, stored) -> list:
+    if stored is None or not records:
+        return records
+    stored = widen(stored).set_index("Symbol")
+    df = pd.DataFrame(records)
+    current = stored.reindex(df["Symbol"])
+    if "fundamentals_date" in current:
+        fundamentals_date = current["fundamentals_date"].fillna(current["scrape_date"])
+    else:
+        fundamentals_date = current["scrape_date"]
+
+    # symbols not stored (e.g. pages archived but never parsed) have no dates and are reparsed as they are
+    archived = df["scrape_date"].to_numpy()
+    newer_fundamentals = fundamentals_date.fillna("").to_numpy(dtype=object) > archived
+    newer_prices = current["scrape_date"].fillna("").to_numpy(dtype=object) > archived
+    if not newer_prices.any():
+        return records
+    print(f"kept the newer stored data of {int(newer_prices.sum())} companies")
+    kept = [records[i] for i in np.flatnonzero(~newer_prices)]
+
+    # the stored price, year range and date applied as if from a market page
+    if (refresh := newer_prices & ~newer_fundamentals).any():
+        prices = current[refresh]
+        market = pd.DataFrame(
+            {"LTP": prices["Market Price"], "High": prices["year_high"], "Low": prices["year_low"]}
+        )
+        refreshed = apply_prices(df[refresh], market).assign(scrape_date=prices["scrape_date"].to_numpy())
+        kept += json.loads(refreshed.to_json(orient="records"))
+    return kept
+
+
+# downloads companies on a background thread and reports through the `events` queue:
+# ("progress", symbol, done, total), ("error", message) and finally ("done", detail_df)
+class DownloadWorker(threading.Thread):
+    def __init__(self, market, smbl_list=None, workers=WORKERS):
+        super().__init__(daemon=True)
+        self.market = market
+        self.smbl_list = smbl_list
+        self.workers = workers
+        self.events = Queue()
+        self.cancelled = threading.Event()
+        self.paused = threading.Event()
+
+    def run(self):
+        try:
+            self.market.process_companies(
+                self.smbl_list,
+                self.workers,
+                on_progress=self.report,
+                cancel=self.cancelled,
+                pause=self.paused,
+            )
+            if self.market.failed:
+                self.events.put(
+                    ("error", f"Could not download {len(self.market.failed)} companies, try again later: "
+                     + ", ".join(self.market.failed))
+                )
+        except requests.exceptions.RequestException as error:
+            self.events.put(("error", f"Download stopped: {error}"))
+        finally:
+            # partial results are already saved in the store
+            self.events.put(("done", get_store().load()))
+
+    def report(self, symbol, done, total):
+        self.events.put(("progress", symbol, done, total))
+
+    def pause(self):
+        self.paused.set()
+
+    def resume(self):
+        self.paused.clear()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.paused.clear()
+
+
+# avg_<kind>_rate and avg_<kind>_prob of many companies at once
+# benefits: rows of (Symbol, kind, year, value), kind: "dvnd" or "bonus", e.g. ("NABIL", "dvnd", "(FY:2078-2079)", "10.00%")
+# returns (dataframe indexed by Symbol, symbols with rows that could not be parsed)
+def describe_benefits(benefits) -> tuple:
+    df = pd.DataFrame(benefits, columns=["Symbol", "kind", "year", "value"])
+
+    # parse date of format "(FY: start_yr-end_yr)" and percents like "1,200.50%"
+    years = df["year"].str.extract(r"(\d*)-(\d*)")
+    df["start_yr"] = pd.to_numeric(years[0], errors="coerce")
+    df["end_yr"] = pd.to_numeric(years[1], errors="coerce")
+    df["percent"] = pd.to_numeric(
+        df["value"].str.strip("%").str.replace(",", "", regex=False).str.strip(), errors="coerce"
+    )
+
+    invalid = df[["start_yr", "end_yr", "percent"]].isna().any(axis=1)
+    invalid_symbols = set(df.loc[invalid, "Symbol"])
+    df = df[~df["Symbol"].isin(invalid_symbols)].astype({"start_yr": int, "end_yr": int})
+
+    # highest percent of every fiscal year, kept in descending order within each group
+    df = df.sort_values("percent", ascending=False, kind="stable")
+    df = df.drop_duplicates(subset=["Symbol", "kind", "start_yr", "end_yr"])
+    df = df.sort_values(["Symbol", "kind"], kind="stable")
+
+    groups = df.groupby(["Symbol", "kind"], sort=False)
+    summary = groups.agg(
+        start=("start_yr", "min"), end=("end_yr", "max"), n=("start_yr", "size")
+    )
+
+    # sums of each group's contiguous slice, in the same order and precision as a per-company sum
+    percent = df["percent"].to_numpy()
+    bounds = np.cumsum([0, *summary["n"]])
+    summary["total"] = [percent[i:j].sum() for i, j in zip(bounds[:-1], bounds[1:])]
+
+    span = summary["end"] - summary["start"]
+    summary["rate"] = (summary["total"] / span).round(2)
+    summary["prob"] = (summary["n"] / span * 100).round(2)
+
+    averages = summary[["rate", "prob"]].unstack("kind")
+    averages.columns = [f"avg_{kind}_{stat}" for stat, kind in averages.columns]
+    return averages, invalid_symbols
+
+
+# fill avg_* of the details records in one batch, records with unparseable tables are dropped
+def add_benefits(records: list, benefits: list) -> list:
+    averages, invalid_symbols = describe_benefits(benefits)
+    averages = averages.to_dict("index")
+
+    described = []
+    for details in records:
+        if details["Symbol"] in invalid_symbols:
+            metrics.count("invalid_benefits")
+            print(f"invalid dividend or bonus table for {details['Symbol']}")
+            continue
+
+        # companies without dividends or bonus get 0
+        values = averages.get(details["Symbol"], {})
+        for kind in ["dvnd", "bonus"]:
+            for stat in ["rate", "prob"]:
+                value = values.get(f"avg_{kind}_{stat}", np.nan)
+                details[f"avg_{kind}_{stat}"] = 0 if np.isnan(value) else float(value)
+        described.append(details)
+    return described
+
+
+# valuation metrics derived from the details, computed for a whole batch when it is saved
+DERIVED_COLUMNS = ["dvnd_yield", "graham_number", "graham_margin", "from_year_low", "from_year_high"]
+
+
+# df with DERIVED_COLUMNS: dividend yield (%) at the market price, Graham number sqrt(22.5 * EPS * book value)
+# (missing unless both are positive) and the % the price is below it, above the year low and below the year high
+def derive_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    price = df["Market Price"].to_numpy(dtype=float)
+    eps = df["EPS"].to_numpy(dtype=float)
+    book_value = df["Book Value"].to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        graham = np.sqrt(22.5 * eps * book_value)
+        graham[(eps <= 0) | (book_value <= 0)] = np.nan
+        derived = {
+            "dvnd_yield": df["avg_dvnd_rate"].to_numpy(dtype=float) * FACE_VALUE / price,
+            "graham_number": graham,
+            "graham_margin": (graham / price - 1) * 100,
+            "from_year_low": (price / df["year_low"].to_numpy(dtype=float) - 1) * 100,
+            "from_year_high": (1 - price / df["year_high"].to_numpy(dtype=float)) * 100,
         }
-        response = requests.get("https://merolagani.com/CompanyList.aspx", headers=headers).text
-        
-        # parsing and setting sector names
-        soup = BeautifulSoup(response, features="lxml")
-        for sectorRow in soup.find_all(attrs ={"class":"panel-default"}):
-            sector = sectorRow.find('a').get_text().strip()
-            try:
-                companyRows = sectorRow.find_all("tr")[1:]
-            except TypeError:
-                print("error in finding sectors")
-                continue
-            self.companies[sector] = [row.find('a').get_text().strip() for row in companyRows]
-            
+    for column, values in derived.items():
+        df[column] = np.where(np.isfinite(values), values, np.nan).round(2)
+    return df
+
+
+# fills DERIVED_COLUMNS of the given details dicts with one derive_metrics over all of them
+def add_derived(records: list) -> list:
+    if not records:
+        return records
+    columns = ["Market Price", "EPS", "Book Value", "avg_dvnd_rate", "year_low", "year_high"]
+    df = derive_metrics(coerce_numeric(pd.DataFrame(records, columns=columns)))
+    for details, values in zip(records, df[DERIVED_COLUMNS].to_numpy()):
+        details.update((column, None if np.isnan(value) else float(value)) for column, value in zip(DERIVED_COLUMNS, values))
+    return records
+
+
+# weighted sum of the z-scores (clipped to +-3) of the columns in `weights` (default: SCORE_WEIGHTS)
+# a missing value counts as average
+def score(df: pd.DataFrame, weights=None) -> pd.Series:
+    weights = weights if weights else SCORE_WEIGHTS
+    total = np.zeros(len(df))
+    for column, weight in weights.items():
+        values = df[column].to_numpy(dtype=float)
+        std = np.nanstd(values) if np.isfinite(values).any() else 0
+        if not std > 0:
+            continue
+        z = np.clip((values - np.nanmean(values)) / std, -3, 3)
+        total += weight * np.nan_to_num(z)
+    return pd.Series(total, index=df.index, name="score")
+
+
+# the k best scored rows (all if k is None, none if k <= 0) of the rows passing `criteria`, best first
+# only the top k are sorted, the rest is partitioned off in O(n). `screener`: a Screener of df to reuse
+def rank(df: pd.DataFrame, k=None, weights=None, criteria=None, screener=None) -> pd.DataFrame:
+    weights = weights if weights else SCORE_WEIGHTS
+    if criteria:
+        df = df.iloc[(screener if screener else Screener(df)).positions(criteria)]
+    # e.g. history snapshots from before the derived metrics existed
+    if set(DERIVED_COLUMNS) - set(df.columns):
+        df = derive_metrics(coerce_numeric(df))
+    if missing := set(weights) - set(df.columns):
+        raise KeyError(sorted(missing))
+
+    scores = score(df, weights).to_numpy()
+    k = len(df) if k is None else max(0, min(k, len(df)))
+    order = np.argpartition(-scores, k - 1)[:k] if 0 < k < len(df) else np.arange(k)
+    order = order[np.argsort(-scores[order], kind="stable")]
+
+    columns = list(dict.fromkeys(["Symbol", "Sector", "Market Price", *weights, *DERIVED_COLUMNS]))
+    ranked = df.iloc[order][[column for column in columns if column in df.columns]]
+    return ranked.assign(score=scores[order]).reset_index(drop=True)
+
+
+# trading sessions of NEPSE: every day except CLOSED_WEEKDAYS and the holidays, closing at MARKET_CLOSE
+class TradingCalendar:
+    def __init__(self, holidays=(), closed_weekdays=CLOSED_WEEKDAYS, close=MARKET_CLOSE):
+        self.holidays = set(holidays)
+        self.closed_weekdays = set(closed_weekdays)
+        self.close = close
+
+    # holidays.txt: one YYYY-MM-DD per line, anything after "#" is a comment
+    @classmethod
+    def load(cls, path=None):
+        path = path if path else os.path.join(get_path(), "holidays.txt")
+        holidays = set()
+        try:
+            with open(path) as file:
+                for line in file:
+                    if text := line.split("#", 1)[0].strip():
+                        holidays.add(datetime.strptime(text, "%Y-%m-%d").date())
+        except FileNotFoundError:
+            pass
+        return cls(holidays)
+
+    def is_session(self, day) -> bool:
+        return day.weekday() not in self.closed_weekdays and day not in self.holidays
+
+    # latest session on or before the day
+    def session_on_or_before(self, day):
+        for _ in range(366):
+            if self.is_session(day):
+                return day
+            day -= timedelta(days=1)
+        raise ValueError("no trading session in the last year")
+
+    # date of the last session that has closed, taking `present` (default: now) as reference
+    def last_session(self, present=None):
+        present = present if present else datetime.now()
+        today = present.date()
+        if present.time() > self.close and self.is_session(today):
+            return today
+        return self.session_on_or_before(today - timedelta(days=1))
+
+    # date a scrape made at `present` is filed under, scrapes on closed days count for the session before
+    def session_of(self, present=None):
+        present = present if present else datetime.now()
+        return self.session_on_or_before(present.date())
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+# shared trading calendar, holidays.txt is read on first use
+def get_calendar() -> TradingCalendar:
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = TradingCalendar.load()
+        return _calendar
+
+
+# date a scrape made now is filed under
+def scrape_day() -> str:
+    return str(get_calendar().session_of())
+
+
+# class for nepali share market
+class NEPSE:
+    # the saved company list is used if younger than max_age seconds (None: any age)
+    # companies: {sector: [symbols]} to use instead of the saved or downloaded list
+    def __init__(self, max_age=COMPANIES_TTL, companies=None):
+        self.retry_queue = Queue()  # symbols that failed transiently in the current round
+        self.failed = []  # symbols still failing after the last run's retry rounds
+
+        if companies is not None:
+            self.age = 0
+            self.set_companies(companies)
+            return
+
+        companies, self.age = load_companies()
+
+        if companies is None or (max_age is not None and self.age > max_age):
+            # getting the company_list webpage (source: Merolagani)
+            companies, self.age = download_companies(), 0
+
+        self.set_companies(companies)
+
+    def set_companies(self, companies: dict):
+        self.companies = companies
         self.sectors = list(self.companies.keys())
 
+    def is_stale(self):
+        return self.age > COMPANIES_TTL
+
     def get_sectors(self):
         return self.sectors
 
@@ -140,247 +2076,665 @@ class NEPSE:
             print(date_string)
             raise ValueError("Invalid date_string")
 
-    def process_companies(self, smbl_list=None) -> pd.DataFrame:
-        if smbl_list == None:
-            smbl_list = self.get_companies()
-
-        outdated, updated = self.get_update_status(smbl_list)  # list of outdated comp_symbols, rest_df
-
-        # terminating if all up-to-date
-        if len(outdated) == 0:
-            show_popup(msg="Selected companies up-to-date.")
-            return updated  # type: ignore
-        else:
-            pass
-
-        # handling progress_bar
-        progress_popup = tk.Tk()
-        progress_popup.title("Processing")
-        progress_popup.geometry(f"650x100")
-        bar = ttk.Progressbar(progress_popup, orient="horizontal", length=500)
-        bar["value"] = 0
-        bar["maximum"] = len(outdated)
-        bar.pack(pady=10)
-
-        current_smbl = tk.StringVar(progress_popup)
-        label_current_smbl = tk.Label(progress_popup, textvariable=current_smbl, font=("Helvetica", 10))
-        label_current_smbl.pack()
-
-        progress = tk.StringVar(progress_popup)
-        label_progress = tk.Label(progress_popup, textvariable=progress, font=("Helvetica", 8))
-        label_progress.pack(pady=5)
-
-        rows = []
-        # creating the dataframe
-        for comp_name in outdated:
-            current_smbl.set(comp_name)
-            bar.update()
+    # download companies concurrently, yields (symbol, Company or None) as they complete
+    # symbols that failed transiently are put on `retry_queue`
+    # no new downloads start while `pause` is set, and none after `cancel` is set
+    # from PARSE_MIN companies on, pages are parsed by `processes` processes instead of the download threads
+    def iter_companies(
+        self, smbl_list: list, workers=WORKERS, cancel=None, pause=None, describe=True, profiler=None,
+        processes=PARSE_PROCESSES,
+    ):
+        cancel = cancel if cancel else threading.Event()
+        pause = pause if pause else threading.Event()
+        stop = threading.Event()
+
+        # result of download(comp_name), None if it was cancelled or failed
+        def attempt(comp_name, download):
+            while pause.is_set() and not (cancel.is_set() or stop.is_set()):
+                sleep(0.1)
+            if cancel.is_set() or stop.is_set():
+                metrics.count("cancelled")
+                return None
             try:
-                rows.append(Company(comp_name).details)
+                with profiler.profile() if profiler else nullcontext():
+                    return download(comp_name)
+            except CircuitOpenError:
+                raise
+            except requests.exceptions.RequestException as error:
+                metrics.count("deferred")
+                print(f"could not get webpage of {comp_name}, retrying later: {error}")
+                self.retry_queue.put(comp_name)
+                return None
             except ValueError:
-                continue
-
-            # update progressbar
-            bar["value"] += 1.0
-            progress.set(f"{int(bar['value'])}/{len(outdated)}")
-            bar.update()
-
-        # updating popup after completed
-        current_smbl.set("Completed")
-        label_progress.destroy()
-        tk.Button(
-            progress_popup,
-            text="Done",
-            font=("Helvetica", 10),
-            command=progress_popup.destroy,
-        ).pack(pady=10)
+                metrics.count("failed")
+                return None
 
-        # handle return df
-        updates_df = pd.DataFrame(rows)
-        if isinstance(updated, pd.DataFrame):
-            updates_df = pd.concat([updates_df, updated])
+        if processes and len(smbl_list) >= PARSE_MIN:
+            results = self.pipeline(smbl_list, workers, processes, cancel, stop, attempt, describe)
+        else:
+            results = self.download_and_parse(smbl_list, workers, cancel, stop, attempt, describe)
+        yield from results
 
-        updates_df.set_index("Symbol").to_csv(f"{get_path()}\\data.csv")
-        return updates_df
+    # download and parse every page on the download threads
+    def download_and_parse(self, smbl_list, workers, cancel, stop, attempt, describe):
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            futures = {
+                executor.submit(attempt, smbl, lambda smbl: Company(smbl, describe)): smbl
+                for smbl in smbl_list
+            }
+            for future in as_completed(futures):
+                if cancel.is_set():
+                    break
+                yield futures[future], future.result()
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # download threads put raw pages on a queue of PARSE_QUEUE pages that parsing processes work off,
+    # a full queue blocks the downloads, so memory stays flat however many companies are fetched
+    def pipeline(self, smbl_list, workers, processes, cancel, stop, attempt, describe):
+        pages = Queue(maxsize=PARSE_QUEUE)
+        scrape_date = scrape_day()
+
+        def download(comp_name):
+            try:
+                page = attempt(comp_name, Company.get_page)
+            except Exception as error:
+                page = error
+            try:
+                pages.put_nowait((comp_name, page))
+                return
+            except Full:
+                metrics.count("parse_backlog")
+            while not stop.is_set():
+                try:
+                    pages.put((comp_name, page), timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        # spawned processes, forking the threads of a running download is unsafe
+        parsers = ProcessPoolExecutor(max(1, processes), mp_context=multiprocessing.get_context("spawn"))
+        downloads = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            for smbl in smbl_list:
+                downloads.submit(download, smbl)
+
+            parsing, received = {}, 0
+            while (received < len(smbl_list) or parsing) and not cancel.is_set():
+                # pages are taken off the queue only as fast as the processes parse them
+                while received < len(smbl_list) and len(parsing) < 2 * processes:
+                    try:
+                        comp_name, page = pages.get(timeout=0 if parsing else 0.1)
+                    except Empty:
+                        break
+                    received += 1
+                    if isinstance(page, Exception):
+                        raise page
+                    if page is None:
+                        yield comp_name, None
+                    else:
+                        parsing[parsers.submit(parse_company, comp_name, page, scrape_date)] = comp_name
+
+                if not parsing:
+                    continue
+                done, _ = wait(parsing, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    comp_name = parsing.pop(future)
+                    yield comp_name, self.parsed_company(comp_name, future, describe)
+        finally:
+            stop.set()
+            downloads.shutdown(wait=True, cancel_futures=True)
+            parsers.shutdown(wait=True, cancel_futures=True)
+
+    # Company of a finished parse_company future, None if its page could not be parsed
+    def parsed_company(self, comp_name, future, describe):
+        try:
+            return Company(comp_name, describe, parsed=future.result())
+        except PageLayoutError as error:
+            metrics.count("layout_errors")
+            print(f"layout of the webpage of {comp_name} changed: {error}")
+        except ValueError:
+            pass
+        metrics.count("failed")
+        return None
+
+    # on_progress(symbol, done, total) is called once with symbol None before the first download
+    # every call is one run of `metrics`, download threads are profiled by `profiler` if given
+    # outdated companies whose fundamentals are younger than FUNDAMENTALS_TTL days only get
+    # their prices refreshed from the market page, unless `full`
+    def process_companies(
+        self, smbl_list=None, workers=WORKERS, on_progress=None, cancel=None, pause=None, profiler=None,
+        full=False, processes=PARSE_PROCESSES,
+    ) -> pd.DataFrame:
+        if smbl_list == None:
+            smbl_list = self.get_companies()
 
-    def get_update_status(self, smbl_list: list):
+        # symbols left on the queue by a cancelled run must not be retried in this one
+        self.failed = []
+        self.retry_queue = Queue()
+        breaker.reset()
+        metrics.start_run()
         try:
-            full_df = pd.read_csv(f"{get_path()}\\data.csv")
-        except FileNotFoundError:
-            return smbl_list, None
+            # companies staged by a run that died before describing them
+            if records := self.save_batch(*get_store().staged()):
+                metrics.count("saved", len(records))
+                print(f"saved {len(records)} companies downloaded by an interrupted run")
+
+            with metrics.span("merge"):
+                outdated, updated = self.get_update_status(smbl_list)  # list of outdated comp_symbols, rest_df
+            metrics.count("skipped", len(smbl_list) - len(outdated))
+
+            refreshed = False
+            if outdated and not full:
+                remaining = self.refresh_prices(outdated)
+                refreshed, outdated = len(remaining) < len(outdated), remaining
+
+            if on_progress:
+                on_progress(None, 0, len(outdated))
+
+            # terminating if all up-to-date
+            if len(outdated) == 0:
+                if not refreshed:
+                    return updated  # type: ignore
+                get_store().export_csv()
+                return get_store().load()
+
+            return self.download_outdated(outdated, workers, on_progress, cancel, pause, profiler, processes)
+        finally:
+            metrics.finish_run()
+
+    # refresh the prices of stored companies with fresh fundamentals from the market page, one request
+    # returns the symbols that still need their detail page downloaded
+    def refresh_prices(self, symbols: list) -> list:
+        if (stored := get_store().load()) is None:
+            return symbols
+
+        stored = stored[stored["Symbol"].isin(symbols)]
+        fundamentals_date = stored["fundamentals_date"] if "fundamentals_date" in stored else stored["scrape_date"]
+        fundamentals_date = pd.to_datetime(
+            fundamentals_date.fillna(stored["scrape_date"]), format="%Y-%m-%d", errors="coerce"
+        )
+        fresh = stored[fundamentals_date >= pd.Timestamp(datetime.now() - timedelta(days=FUNDAMENTALS_TTL))]
+        if fresh.empty:
+            return symbols
 
-        if not is_valid_df(full_df):  # type:ignore
+        try:
+            market = parse_market_page(fetch_page(f"{BASE_URL}/LatestMarket.aspx"))
+        except (requests.exceptions.RequestException, PageLayoutError) as error:
+            metrics.count("market_page_errors")
+            print(f"could not refresh prices from the market page, downloading companies instead: {error}")
+            return symbols
+
+        with metrics.span("transform"):
+            records = json.loads(apply_prices(widen(fresh), market).to_json(orient="records"))
+        with metrics.span("persist"):
+            get_store().upsert_many(records)
+            get_history().append(records)
+        metrics.count("price_refreshed", len(records))
+
+        refreshed = set(fresh["Symbol"])
+        return [symbol for symbol in symbols if symbol not in refreshed]
+
+    # dividend and bonus tables are described for a batch of companies at once, which are then saved
+    # to the store and the history and taken off the staging table. returns the saved records
+    def save_batch(self, records: list, benefits: list) -> list:
+        if not records:
+            return []
+        symbols = [details["Symbol"] for details in records]
+        with metrics.span("merge"):
+            described = add_derived(add_benefits(records, benefits))
+        with metrics.span("persist"):
+            get_store().upsert_many(described, staged=symbols)
+            get_history().append(described)
+        return described
+
+    # downloads, describes and saves the outdated companies, returns everything stored
+    def download_outdated(self, outdated, workers, on_progress, cancel, pause, profiler, processes=PARSE_PROCESSES):
+        store = get_store()
+        records, benefits = [], []
+
+        def flush():
+            metrics.count("saved", len(self.save_batch(records, benefits)))
+            records.clear()
+            benefits.clear()
+
+        # every company is staged as soon as it arrives and described with the next FLUSH_EVERY,
+        # a crash loses nothing, the next run saves what is still staged
+        # symbols that failed transiently are downloaded again in up to RETRY_ROUNDS more rounds
+        done, pending = 0, outdated
+        try:
+            for round in range(RETRY_ROUNDS + 1):
+                for comp_name, company in self.iter_companies(
+                    pending, workers, cancel, pause, describe=False, profiler=profiler, processes=processes
+                ):
+                    if company is not None:
+                        with metrics.span("persist", comp_name):
+                            store.stage(company.details, company.benefits)
+                        records.append(company.details)
+                        benefits.extend(company.benefits)
+                        done += 1
+                    if len(records) >= FLUSH_EVERY:
+                        flush()
+                    if on_progress:
+                        on_progress(comp_name, done, len(outdated))
+
+                pending = []
+                while not self.retry_queue.empty():
+                    pending.append(self.retry_queue.get())
+                if not pending or (cancel and cancel.is_set()):
+                    break
+                if round < RETRY_ROUNDS:
+                    metrics.count("retried", len(pending))
+                    print(f"retrying {len(pending)} companies")
+        finally:
+            flush()
+
+        self.failed = pending
+        if pending:
+            metrics.count("gave_up", len(pending))
+
+        # csv kept as an export of the store
+        with metrics.span("persist"):
+            store.export_csv()
+        with metrics.span("merge"):
+            return store.load()
+
+    def get_update_status(self, smbl_list: list, full_df=None):
+        if full_df is None:
+            full_df = get_store().load()
+
+        if full_df is None or not is_valid_df(full_df):  # type:ignore
             return smbl_list, None
 
         # setting index to make symbol searchable
-        full_df["smbl"] = full_df["Symbol"]
-        full_df.set_index("smbl", inplace=True)
+        full_df = full_df.set_index(full_df["Symbol"].rename("smbl"))
 
-        bool_outdated = full_df["scrape_date"].apply(self.is_outdated)
-        outdated_df, updated_df = full_df[bool_outdated], full_df[~bool_outdated]
+        # one cutoff for the whole batch, unparseable dates count as outdated
+        scrape_dates = pd.to_datetime(full_df["scrape_date"], format="%Y-%m-%d", errors="coerce")
+        bool_outdated = ~(scrape_dates >= pd.Timestamp(self.staleness_cutoff())).to_numpy()
+        bool_requested = full_df.index.isin(smbl_list)
 
-        df_smbls = []  # user given symbols present in the dataframe
-        outdated = []  # outdated symbols to be returned
+        symbols = pd.Index(smbl_list)
+        missing = symbols[~symbols.isin(full_df.index)]  # user given symbols absent from the dataframe
 
-        for smbl in smbl_list:
-            try:
-                full_df.loc[smbl]
-                df_smbls.append(smbl)
-            except KeyError:
-                outdated.append(smbl)
-
-        if len(df_smbls) == 0:
+        if len(missing) == len(symbols):
             return smbl_list, full_df
-        else:
-            remaining = []
-            for smbl in list(outdated_df.index.values):
-                if smbl in df_smbls:
-                    outdated.append(smbl)
-                else:
-                    remaining.append(outdated_df.loc[smbl])
 
-            updated_df = pd.concat(
-                [pd.DataFrame(remaining), updated_df]
-            )  # all remaining as dataframe
-            updated_df.reset_index(inplace=True, drop=True)  # resetting index
+        # return: outdated smbl list, up-to-date dataframe + remaining
+        outdated = missing.tolist() + full_df.index[bool_outdated & bool_requested].tolist()
+        updated_df = pd.concat(
+            [full_df[bool_outdated & ~bool_requested], full_df[~bool_outdated]]
+        )
+        updated_df.reset_index(inplace=True, drop=True)  # resetting index
+        return outdated, updated_df
 
-            # return: outdated smbl list, up-to-date dataframe + remaining
-            return outdated, updated_df
+    # scrape dates before the returned date, the last closed session, are outdated
+    def staleness_cutoff(self, present=None):
+        return get_calendar().last_session(present)
 
     def is_outdated(self, date):  # date as a string in year-month-day format
         scrape_date = datetime.strptime(date, "%Y-%m-%d").date()
-        present = datetime.now()
-        nepse_end = time(15, 0)
-        present_day = present.strftime("%A")
+        return self.staleness_cutoff() > scrape_date
 
-        if present_day == "Sunday":
-            if present.time() > nepse_end:
-                return present.date() > scrape_date
-            else:
-                return (present.date() - timedelta(days=2)) > scrape_date
 
-        elif present_day == "Saturday":
-            return (present.date() - timedelta(days=1)) > scrape_date
-
-        else:
-            if present.time() > nepse_end:
-                return present.date() > scrape_date
-            else:
-                return (present.date() - timedelta(days=1)) > scrape_date
+class Company(NEPSE):
+    # parsed is a result of parse_company from a parsing process, otherwise the page is downloaded and parsed here
+    def __init__(self, smbl, describe=True, parsed=None):
+        if parsed is None:
+            if (page := Company.get_page(smbl)) is None:
+                raise ValueError("Invalid symbol or broken webpage")
+            parsed = Company.parse(smbl, page)
+        self.details, self.benefits, spans = parsed
+        for stage, seconds in spans.items():
+            metrics.record(stage, seconds, smbl)
+
+        # avg_* columns are left for a batch of companies unless describe
+        if describe:
+            if not add_benefits([self.details], self.benefits):
+                raise ValueError("Invalid dividend or bonus table")
+            add_derived([self.details])
+            pprint(self.details)
 
+    @classmethod
+    def get_page(cls, symbol):
+        try:
+            page = fetch_page(
+                f"{BASE_URL}/CompanyDetail.aspx?symbol={symbol.replace(' ', '%')}", symbol
+            )
+            with metrics.span("archive", symbol):
+                get_archive().put("CompanyDetail", symbol, page)
+            return page
+        except requests.exceptions.HTTPError as error:
+            # transient failures go back to the caller to be retried later
+            if is_transient(error):
+                raise
+            metrics.count("http_errors")
+            print(f"could not get webpage of {symbol}: {error}")
+            return None
 
-class Company(NEPSE):
-    def __init__(self, smbl):
-        if not (dfs := Company.get_dfs(smbl)):
+    @classmethod
+    def parse(cls, symbol, page):
+        try:
+            return parse_company(symbol, page, scrape_day())
+        except PageLayoutError as error:
+            metrics.count("layout_errors")
+            print(f"layout of the webpage of {symbol} changed: {error}")
             raise ValueError("Invalid symbol or broken webpage")
 
-        # df0 : detail df
-        # df1: dividends df
-        # df2: bonus df
-        # df2: right shares df
-        
-        # setting the detailsf        
-        detail_df = dfs[0].iloc[0:12] #only these are organized
-
-        self.details = detail_df.set_index(0).to_dict()[1]
-        self.details["1 Year Yield"] = self.details["1 Year Yield"].strip("%")
-        self.details["Symbol"] = smbl
-        self.details["EPS"] = float(self.details["EPS"].split()[0])
-        [self.details["year_high"], self.details["year_low"]] = self.details["52 Weeks High - Low"].split("-")
-        
-        del self.details["Last Traded On"]
-        del self.details["52 Weeks High - Low"]
-        del self.details["% Change"]
-        
-        
-        
-        for key, value in self.details.items():
-            try: 
-                self.details[key] = float(value)
-            except ValueError:
-                pass
-            
-        self.details["year_delta"] = self.details["year_high"] - self.details["year_low"]
 
-        today = datetime.today()
-        if today.strftime("%A") == "Saturday":
-            self.details["scrape_date"] = str(
-                datetime.today().date() - timedelta(days=1)
-            )
-        else:
-            self.details["scrape_date"] = str(datetime.today().date())
 
-        
-        # dividends
-        if dfs[1].empty:
-            self.details["avg_dvnd_rate"], self.details["avg_dvnd_prob"] = 0, 0
-        else:
-            self.dividends = self.process_benefit(
-                value_df=dfs[1]["Fiscal Year"], year_df=dfs[1]["Value"]
-            )
-            
-            (
-                self.details["avg_dvnd_rate"],
-                self.details["avg_dvnd_prob"],
-            ) = self.describe_benefit(self.dividends)
-
-        # bonus
-        if dfs[2].empty:
-            self.details["avg_bonus_rate"], self.details["avg_bonus_prob"] = 0, 0
+
+# memoized sort orders of one version of a dataframe
+class SortCache:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.orders = {}
+
+    # row positions of df sorted by the keys, missing values of the first key last
+    def order(self, keys: tuple, ascending=True) -> np.ndarray:
+        if (keys, ascending) in self.orders:
+            return self.orders[(keys, ascending)]
+
+        if ascending:
+            # lexsort is stable and sorts by the last key first
+            order = np.lexsort([self.codes(key) for key in reversed(keys)])
         else:
-            self.bonus = self.process_benefit(
-                value_df=dfs[2]["Value"], year_df=dfs[2]["Fiscal Year"]
-            )
-            (
-                self.details["avg_bonus_rate"],
-                self.details["avg_bonus_prob"],
-            ) = self.describe_benefit(self.bonus)
+            order = self.order(keys)[::-1]
+            missing = self.df[keys[0]].isna().to_numpy()[order]
+            order = np.concatenate([order[~missing], order[missing]])
+
+        self.orders[(keys, ascending)] = order
+        return order
+
+    # sortable integer codes of a column, missing values last
+    def codes(self, key: str) -> np.ndarray:
+        codes, _ = pd.factorize(self.df[key], sort=True)
+        codes[codes == -1] = codes.max() + 1
+        return codes
+
+    # rows of subset (rows of df) sorted by the keys
+    def sort(self, subset: pd.DataFrame, keys: list, ascending=True) -> pd.DataFrame:
+        order = self.order(tuple(keys), ascending)
+        selected = np.zeros(len(self.df), dtype=bool)
+        selected[self.df.index.get_indexer(subset.index)] = True
+        return self.df.iloc[order[selected[order]]]
+
+
+# result table that only fills the rows in view, reused across renders
+class DataTable:
+    def __init__(self, master, on_heading, height=50):
+        self.on_heading = on_heading
+        self.height = height  # rows in view
+        self.values = np.empty((0, 0), dtype=object)
+        self.float32 = []  # positions of float32 columns
+        self.columns = []
+        self.shown = []  # values currently shown by each row item
+        self.offset = 0  # position of the first row in view
 
-        
-        pprint(self.details)
+        # df Frame
+        self.frame = ttk.Frame(master)
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
 
+        #tree
+        self.tree = ttk.Treeview(self.frame, show="headings", height=height)
+        self.tree.grid(row=0, column=0,sticky="news")
 
-    @classmethod
-    def get_dfs(cls, symbol):
-        try:
-            dfs = pd.read_html(
-                f"https://merolagani.com/CompanyDetail.aspx?symbol={symbol.replace(' ', '%')}"
-            )
-            sleep(0.3)
+        # scrollbar-vsb, scrolls through the dataframe instead of the tree items
+        self.vsb = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.vsb.grid(row=0, column=1, sticky="ns",padx=10,)
 
-            if len(dfs) < 4:
-                print(f"not all tables found for {symbol}, check webpage")
-                return None
-        except ValueError:
-            print(f"no table found for {symbol} , check webpage")
-            return None
-        return dfs
+        # on_heading(column, extend), extend: shift was held
+        self.tree.bind("<ButtonRelease-1>", self.click)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-event.delta // 120 * 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
 
-    def process_benefit(self, year_df, value_df):  # get suitable datframe of dividend/bonus
-        
-        # setting the dividend values
-        df = pd.DataFrame()
-        df[["start_yr", "end_yr"]] = year_df.apply(
-            lambda x: pd.Series(super(Company, self).parse_date(x))
-        )
-        df[["percent"]] = value_df.apply(
-            lambda x: pd.Series(float(x.strip("%").replace(",", "")))
-        )
-        df.sort_values("percent", inplace=True, ascending=False)
-        return df.drop_duplicates(
-            subset=["start_yr", "end_yr"], ignore_index=True, keep="first"
-        )
+    def set_df(self, df: pd.DataFrame):
+        cols = list(df.keys())
+        if cols != self.columns:
+            self.set_columns(cols)
+
+        self.values = df.to_numpy(dtype=object)
+        # float32 metrics are shown by their shortest text, 1234.56 instead of 1234.56005859375
+        self.float32 = [i for i, dtype in enumerate(df.dtypes) if dtype == np.float32]
+        self.offset = 0
+        self.refresh()
+
+    def set_columns(self, cols: list):
+        self.columns = cols
+        self.tree.delete(*self.tree.get_children())
+        self.shown = []
+        self.tree.configure(columns=cols)
+
+        # set column and display headings
+        for col in cols:
+            self.tree.column(col,width=100, anchor="center")
+            self.tree.heading(col, text=col)
+
+    def click(self, event):
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return
+        col = self.columns[int(self.tree.identify_column(event.x)[1:]) - 1]
+        self.on_heading(col, extend=bool(event.state & 0x0001))
+
+    # show the rows at the current offset, only changed rows are updated
+    def refresh(self):
+        rows = self.values[self.offset : self.offset + self.height].tolist()
+        for row in rows:
+            for i in self.float32:
+                row[i] = str(np.float32(row[i]))
+
+        while len(self.shown) < len(rows):
+            self.tree.insert(parent="", index=tk.END, iid=str(len(self.shown)))
+            self.shown.append(None)
+        while len(self.shown) > len(rows):
+            self.shown.pop()
+            self.tree.delete(str(len(self.shown)))
+
+        for i, row in enumerate(rows):
+            if self.shown[i] != row:
+                self.tree.item(str(i), values=row)
+                self.shown[i] = row
+
+        total = max(len(self.values), 1)
+        self.vsb.set(self.offset / total, min(self.offset + self.height, total) / total)
+
+    def scroll_to(self, offset: int):
+        offset = max(0, min(offset, len(self.values) - self.height))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def scroll(self, rows: int):
+        self.scroll_to(self.offset + rows)
+
+    # scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self.values)))
+        elif args[0] == "scroll":
+            step = self.height if args[2] == "pages" else 1
+            self.scroll(int(args[1]) * step)
+
+
+# one loaded version of the saved data, replaced as a whole when the query server reloads
+class QueryData:
+    def __init__(self, df: pd.DataFrame, version: int, cache=None):
+        self.df = df
+        self.version = version
+        self.screener = Screener(df, cache, version)
+        self.sorter = SortCache(self.screener.result)
+        self.symbols = pd.Index(df["Symbol"].astype(str))
+        # widened once, answers take their rows from here instead of widening every response
+        self.wide = widen(self.screener.df)
+        self.wide_result = widen(self.screener.result)
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+
+
+# read-only HTTP/JSON service over the saved data, answering many clients at once from one loaded copy
+# that is swapped for a new one when a scrape saves new data:
+#   GET /screen?criteria=PBV<2&criteria=Sector=='Hydro Power'&sort=PBV&order=desc&limit=50&offset=0
+#   GET /rank?top=20&weights=PBV=-1&criteria=...
+#   GET /symbol/NABIL, /health, /stats (latency per endpoint, json) and /metrics (prometheus text)
+class QueryServer:
+    def __init__(self, host=SERVE_HOST, port=SERVE_PORT, reload_every=SERVE_RELOAD):
+        self.reload_every = reload_every
+        self.cache = ScreenCache()
+        self.metrics = Metrics(names=SERVE_METRIC_NAMES)
+        self.stopped = threading.Event()
+        self.data = None
+        self.reload()
+
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.httpd.daemon_threads = True
+        self.threads = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # loads the store if its version changed, True if new data was loaded
+    # requests in flight keep the data they started with
+    def reload(self) -> bool:
+        store = get_store()
+        version = store.version()
+        if self.data is not None and self.data.version == version:
+            return False
+        if (df := store.load()) is None:
+            return False
+
+        data = QueryData(df, version, self.cache)
+        data.screener.warm(load_screens().values())
+        self.data = data
+        self.metrics.count("reloads")
+        print(f"loaded version {version} of the saved data, {len(df)} rows")
+        return True
+
+    def watch(self):
+        while not self.stopped.wait(self.reload_every):
+            try:
+                self.reload()
+            except (sqlite3.Error, OSError, ValueError) as error:
+                print(f"could not reload the saved data: {error}")
+
+    # (status, json-able body or prometheus text) of a GET request
+    def respond(self, path: str, query: dict) -> tuple:
+        if path == "/metrics":
+            return 200, self.metrics.to_prometheus()
+
+        data = self.data
+        if path == "/health":
+            return 200, {"ok": data is not None, "version": data.version if data else None}
+        if path == "/stats":
+            return 200, {
+                "version": data.version if data else None,
+                "rows": len(data.df) if data else 0,
+                "loaded_at": data.loaded_at if data else None,
+                "latency": self.metrics.summary(),
+                "counters": dict(self.metrics.counters),
+                "cache": {"hits": self.cache.hits, "misses": self.cache.misses},
+            }
+        if data is None:
+            return 503, {"error": "no saved data, run scrape first"}
+
+        criteria = [parse_criterion(text) for text in query.get("criteria", [])]
+        if path == "/screen":
+            result = data.screener.screen(criteria)
+            if sort := query.get("sort"):
+                result = data.sorter.sort(result, sort, ascending=query.get("order", ["asc"])[0] != "desc")
+            offset = int(query.get("offset", [0])[0])
+            limit = int(query.get("limit", [SERVE_LIMIT])[0])
+            return 200, {
+                "version": data.version, "count": len(result),
+                "rows": json_records(data.wide_result.loc[result.index[offset:offset + limit]]),
+            }
+        if path == "/rank":
+            top = int(query.get("top", [SERVE_LIMIT])[0])
+            weights = dict(parse_weight(text) for text in query.get("weights", []))
+            result = rank(data.wide, top, weights, criteria, data.screener)
+            return 200, {"version": data.version, "count": len(result), "rows": json_records(result)}
+        if path.startswith("/symbol/"):
+            position = data.symbols.get_indexer([unquote(path[len("/symbol/"):])])[0]
+            if position == -1:
+                return 404, {"error": f"unknown symbol {path[len('/symbol/'):]}"}
+            return 200, {"version": data.version, "details": json_records(data.wide.iloc[[position]])[0]}
+        return 404, {"error": f"unknown path {path}"}
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out as separate writes, Nagle would hold the body for the client's delayed ack
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                start = perf_counter()
+                url = urlsplit(self.path)
+                try:
+                    status, body = server.respond(url.path, parse_qs(url.query))
+                except KeyError as error:
+                    status, body = 400, {"error": f"unknown column: {error.args[0]}"}
+                except ValueError as error:
+                    status, body = 400, {"error": str(error)}
+                except Exception as error:  # still answered and counted, the server keeps running
+                    print(f"error answering {self.path}: {error!r}")
+                    status, body = 500, {"error": "internal error"}
+
+                if isinstance(body, str):
+                    data, content_type = body.encode(), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(body).encode(), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+                # latency per endpoint, unknown paths share one label
+                endpoint = url.path.split("/")[1] if url.path.count("/") else ""
+                if endpoint not in ("screen", "rank", "symbol", "health", "stats", "metrics"):
+                    endpoint = "other"
+                server.metrics.record(endpoint, perf_counter() - start)
+                server.metrics.count(f"status_{status}")
+
+            def log_message(self, format, *args):
+                pass
 
-    def describe_benefit(self, benefit_df: pd.DataFrame):
-        start, end, n = (
-            benefit_df["start_yr"].min(),
-            benefit_df["end_yr"].max(),
-            benefit_df.shape[0],
-        )
-        rate = round(benefit_df["percent"].sum() / (end - start), 2)
-        probability = round(n / (end - start) * 100, 2)
-        return rate, probability
+        return Handler
+
+    # reloads in a background thread and answers requests until stop()
+    def serve_forever(self):
+        watcher = threading.Thread(target=self.watch, daemon=True)
+        watcher.start()
+        self.threads.append(watcher)
+        self.httpd.serve_forever()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return self
 
+    def stop(self):
+        self.stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# rows of df as json-able dicts, missing values as None
+def json_records(df: pd.DataFrame) -> list:
+    return json.loads(df.to_json(orient="records"))
 
 
 class MyGUI:
@@ -388,15 +2742,23 @@ class MyGUI:
         ## self.detail_df: all information , self.filtered_df:visible information ##
         self.is_online = True
         self.detail_df = None
+        self.screener = None
+        self.sorter = None
+        self.sort_keys = []  # columns of the current sort, first one sorts first
+        self.data_version = 0
+        self.filter_job = None
+        self.worker = None
         self.has_downloaded = False
         self.df_visible = False
 
+        # saved company list of any age, downloaded only on the first run
         try:
-            self.market = NEPSE()
-        except requests.exceptions.ConnectionError:
+            self.market = NEPSE(max_age=None)
+        except requests.exceptions.RequestException:
             self.is_online = False
 
         # window
+        load_gui()
         self.window = tk.Tk()  
         self.window.state('zoomed')  # Windows only
        
@@ -406,6 +2768,12 @@ class MyGUI:
         if self.is_online:
             self.render_download_frame()
 
+            # refreshing an old company list without blocking the window
+            if self.market.is_stale():
+                self.market_updates = Queue()
+                threading.Thread(target=self.refresh_market, daemon=True).start()
+                self.window.after(200, self.poll_market)
+
 
         self.render_filter()
         self.render_order_frame()
@@ -436,11 +2804,30 @@ class MyGUI:
 
         self.download_frame.pack(padx=10, pady=10)
 
-    def render_filter(self):
+    # runs in a background thread, the result is picked up by poll_market
+    def refresh_market(self):
         try:
-            self.detail_df = pd.read_csv(f"{get_path()}//data.csv")
+            self.market_updates.put(download_companies())
+        except requests.exceptions.RequestException:
+            self.market_updates.put(None)
 
-        except FileNotFoundError:
+    def poll_market(self):
+        try:
+            companies = self.market_updates.get_nowait()
+        except Empty:
+            self.window.after(200, self.poll_market)
+            return
+
+        # keeping the saved list if the refresh failed
+        if companies:
+            self.market.set_companies(companies)
+            self.market.age = 0
+            self.drop_sector.set_menu("All", *self.market.get_sectors())
+
+    def render_filter(self):
+        self.detail_df = get_store().load()
+
+        if self.detail_df is None:
             # prompt to download data if online
             if self.is_online:
                 show_popup(win=self.window, msg="Please Download Data")
@@ -454,9 +2841,12 @@ class MyGUI:
 
         # check if detail_df is valid
         if isinstance(self.detail_df, pd.DataFrame) and not(is_valid_df(self.detail_df)):  # type:ignore
-            show_popup(win=self.window, msg="The saved data.csv file is invalid.")
+            show_popup(win=self.window, msg="The saved data is invalid.")
             self.detail_df = None
 
+        if isinstance(self.detail_df, pd.DataFrame):
+            self.set_detail_df(self.detail_df)
+
         self.filter_band = ttk.Frame(self.window)
         self.filter_frame = ttk.Frame(
             self.filter_band
@@ -558,10 +2948,40 @@ class MyGUI:
             row=0, column=12, padx=15, pady=10, sticky="NEWS", rowspan=2
         )
 
+        # live filter: screens while typing, after FILTER_DELAY ms without keystrokes
+        self.live_filter = ttk.BooleanVar(self.filter_frame, True)
+        ttk.Checkbutton(self.filter_frame, text="Live", variable=self.live_filter).grid(
+            row=0, column=13, sticky="W", rowspan=2
+        )
+        # saved screens, shown from the screen cache
+        self.selector_screens = ttk.Menubutton(self.filter_frame, text="Screens")
+        self.selector_screens["menu"] = tk.Menu(self.selector_screens, tearoff=False)
+        self.selector_screens.grid(row=0, column=14, padx=2, sticky="NEWS")
+        ttk.Button(self.filter_frame, width=8, text="Save", command=self.save_current_screen).grid(
+            row=1, column=14, padx=2, sticky="NEWS"
+        )
+        self.update_selector_screens()
+
+        for entry in [
+            self.selector_price,
+            self.selector_book_val,
+            self.selector_PBV,
+            self.selector_eps,
+            self.selector_PE,
+            self.selector_dvnd_rate,
+            self.selector_dvnd_prob,
+            self.selector_bonus_rate,
+            self.selector_bonus_prob,
+            self.selector_year_change,
+            self.selector_year_delta,
+        ]:
+            entry.bind("<KeyRelease>", self.schedule_filter)
+        self.query_sector.trace_add("write", self.schedule_filter)
+
         self.filter_frame.pack()
         self.filter_band.pack(fill="x",pady=30)
 
-        try:  # if data.csv exists
+        try:  # if data is saved
             self.update_selector_sector(self.detail_df)  # type: ignore
         except TypeError:  # detail_df is None type
             pass
@@ -578,6 +2998,8 @@ class MyGUI:
         ttk.OptionMenu(self.order_frame, self.order, "Ascending", "Descending").pack(
             pady=5, side="right"
         )
+        # flipping the order reuses the cached sort
+        self.order.trace_add("write", lambda *args: self.apply_sort())
 
         self.order_frame.pack(pady=30)
 
@@ -585,44 +3007,13 @@ class MyGUI:
         # show count in the order_label
         self.order_label.config(text=f"COUNT: {df.shape[0]}     Sort Order:")
 
-        # rows and columns
-        cols = list(df.keys())
-        rows = df.values.tolist()
-
-        # destroy to avoid duplicates
-        if self.df_visible:
-            self.df_frame.destroy()
-
-        # df Frame
-        self.df_frame = ttk.Frame(self.window)
-                
-        self.df_frame.rowconfigure(0, weight=1)
-        self.df_frame.columnconfigure(0, weight=1)
-        
-        #tree
-        tree = ttk.Treeview(self.df_frame, columns=cols, show="headings", height=50)
-        tree.grid(row=0, column=0,sticky="news")
-
-        # scrollbar-vsb
-        vsb = ttk.Scrollbar(self.df_frame, orient="vertical", command=tree.yview)
-        vsb.grid(row=0, column=1, sticky="ns",padx=10,)
-        tree.configure(yscrollcommand=vsb.set)
-
-        # set column
-        for col in tree["columns"]:
-            tree.column(col,width=100, anchor="center")
-
-        # display headings
-        for col in cols:
-            tree.heading(col, text=col, command=lambda coln=col: self.my_sort(coln))
-
-        # display rows
-        for row in rows:
-            tree.insert(parent="", index=tk.END, values=row)
+        # the table is built once and reused
+        if not self.df_visible:
+            self.table = DataTable(self.window, on_heading=self.my_sort, height=50)
+            self.table.frame.pack(expand=False,fill="both", pady=5,padx=50)
+            self.df_visible = True
 
-        self.df_frame.pack(expand=False,fill="both", pady=5,padx=50)
-        self.df_visible = True
-        self.df_frame.update()
+        self.table.set_df(df)
 
     def update_selector_sector(self, df: pd.DataFrame):
         # get new options
@@ -644,72 +3035,218 @@ class MyGUI:
         self.query_sector.set("All")
 
     def download_detail_df(self):
+        # one download at a time
+        if self.worker and self.worker.is_alive():
+            return
+
         # download all if sector is not specified
         if self.download_sector.get() == "All":
-            self.detail_df = self.market.process_companies()
+            self.worker = DownloadWorker(self.market)
         else:
-            self.detail_df = self.market.process_companies(
-                self.market.get_companies([self.download_sector.get()])
+            self.worker = DownloadWorker(
+                self.market, self.market.get_companies([self.download_sector.get()])
             )
 
+        self.download_btn.config(state="disabled")
+        self.render_progress()
+        self.worker.start()
+        self.window.after(100, self.poll_download)
+
+    def render_progress(self):
+        self.progress_popup = tk.Toplevel(self.window)
+        self.progress_popup.title("Processing")
+        self.progress_popup.geometry(f"650x130")
+        self.progress_popup.protocol("WM_DELETE_WINDOW", self.worker.cancel)
+
+        self.progress_bar = ttk.Progressbar(self.progress_popup, orient="horizontal", length=500)
+        self.progress_bar["value"] = 0
+        self.progress_bar.pack(pady=10)
+
+        self.current_smbl = tk.StringVar(self.progress_popup, "Checking saved data")
+        tk.Label(self.progress_popup, textvariable=self.current_smbl, font=("Helvetica", 10)).pack()
+
+        self.progress = tk.StringVar(self.progress_popup)
+        tk.Label(self.progress_popup, textvariable=self.progress, font=("Helvetica", 8)).pack(pady=5)
+
+        self.progress_buttons = ttk.Frame(self.progress_popup)
+        self.pause_btn = ttk.Button(
+            self.progress_buttons, text="Pause", width=8, command=self.toggle_pause
+        )
+        self.pause_btn.pack(side="left", padx=5)
+        ttk.Button(
+            self.progress_buttons, text="Cancel", width=8, command=self.worker.cancel
+        ).pack(side="left", padx=5)
+        self.progress_buttons.pack()
+
+    def toggle_pause(self):
+        if self.worker.paused.is_set():
+            self.worker.resume()
+            self.pause_btn.config(text="Pause")
+        else:
+            self.worker.pause()
+            self.pause_btn.config(text="Resume")
+
+    # handles the worker's events on the main thread
+    def poll_download(self):
+        while True:
+            try:
+                event = self.worker.events.get_nowait()
+            except Empty:
+                self.window.after(100, self.poll_download)
+                return
+
+            if event[0] == "progress":
+                symbol, done, total = event[1:]
+                self.progress_bar["maximum"] = max(total, 1)
+                self.progress_bar["value"] = done
+                if symbol:
+                    self.current_smbl.set(symbol)
+                    self.progress.set(f"{done}/{total}")
+                elif total == 0:
+                    self.current_smbl.set("Selected companies up-to-date.")
+
+            elif event[0] == "error":
+                show_popup(win=self.window, msg=event[1])
+
+            elif event[0] == "done":
+                self.finish_download(event[1])
+                return
+
+    def finish_download(self, detail_df):
+        # updating popup after completed
+        if self.worker.cancelled.is_set():
+            self.current_smbl.set("Cancelled, downloaded companies are saved")
+        elif self.progress.get():
+            self.current_smbl.set("Completed")
+        self.progress_buttons.destroy()
+        ttk.Button(
+            self.progress_popup, text="Done", command=self.progress_popup.destroy
+        ).pack(pady=10)
+        self.progress_popup.protocol("WM_DELETE_WINDOW", self.progress_popup.destroy)
+        self.download_btn.config(state="normal")
+
+        if not isinstance(detail_df, pd.DataFrame):
+            return
+
         # updating variables
         self.has_downloaded = True
+        self.set_detail_df(detail_df)
         self.update_selector_sector(self.detail_df)
 
+    # everything derived from detail_df is rebuilt for a new version of the data
+    def set_detail_df(self, detail_df: pd.DataFrame):
+        self.detail_df = detail_df
+        self.data_version += 1
+
+        # column types are coerced once per dataset, results of the old data are dropped
+        screen_cache.invalidate()
+        self.screener = Screener(self.detail_df, screen_cache, self.data_version)
+        self.sorter = SortCache(self.screener.result)
+        self.sort_keys = []
+        self.screener.warm(load_screens().values())
+
+    # debounced apply_fitler for live filtering
+    def schedule_filter(self, *args):
+        if not self.live_filter.get():
+            return
+        if self.filter_job:
+            self.window.after_cancel(self.filter_job)
+        self.filter_job = self.window.after(FILTER_DELAY, self.apply_fitler)
+
     def apply_fitler(self):
-        while True:
-            # disable filter if self.detail_df != dataframe
-            if not isinstance(self.detail_df, pd.DataFrame):
-                break
-            # makes sector blank so that get_sector returns all
-            elif self.query_sector.get() == "All":
-                criteria = {}  
-            else:
-                criteria = {"Sector": f"== '{self.query_sector.get()}'"}
-
-            num_criteria = {
-                    "Market Price": "< " + self.selector_price.get(),
-                    "Book Value": "< " + self.selector_book_val.get(),
-                    "PBV": "< " + self.selector_PBV.get(),
-                    "EPS": "> " + self.selector_eps.get(),
-                    "P/E Ratio": "< " + self.selector_PE.get(),
-                    "avg_dvnd_rate": "> " + self.selector_dvnd_rate.get(),
-                    "avg_dvnd_prob": "> " + self.selector_dvnd_prob.get(),
-                    "avg_bonus_rate": "> " + self.selector_bonus_rate.get(),
-                    "avg_bonus_prob": "> " + self.selector_bonus_prob.get(),
-                    "1 Year Yield": self.selector_year_change.get(),
-                    "year_delta": self.selector_year_delta.get(),
-                }
+        self.filter_job = None
+        if (criteria := self.read_criteria()) is not None:
+            self.show_screen(criteria)
+
+    # criteria of the filter entries, None without data or if an entry is invalid
+    def read_criteria(self):
+        # disable filter if self.detail_df != dataframe
+        if not isinstance(self.detail_df, pd.DataFrame):
+            return None
+        # makes sector blank so that get_sector returns all
+        elif self.query_sector.get() == "All":
+            criteria = []
+        else:
+            criteria = [("Sector", "==", self.query_sector.get())]
+
+        # (column, operator, entry), operator None: typed by the user
+        selectors = [
+            ("Market Price", "<", self.selector_price),
+            ("Book Value", "<", self.selector_book_val),
+            ("PBV", "<", self.selector_PBV),
+            ("EPS", ">", self.selector_eps),
+            ("P/E Ratio", "<", self.selector_PE),
+            ("avg_dvnd_rate", ">", self.selector_dvnd_rate),
+            ("avg_dvnd_prob", ">", self.selector_dvnd_prob),
+            ("avg_bonus_rate", ">", self.selector_bonus_rate),
+            ("avg_bonus_prob", ">", self.selector_bonus_prob),
+            ("1 Year Yield", None, self.selector_year_change),
+            ("year_delta", None, self.selector_year_delta),
+        ]
+
+        # validating user input, blank inputs are ignored
+        try:
+            for column, op, entry in selectors:
+                value = entry.get().strip()
+                if value in ("", "<", ">", "="):
+                    continue
+                if op is None:
+                    op, value = parse_condition(value)
+                criteria.append((column, op, float(value)))
+        except ValueError:
+            return None
+        return criteria
 
-            # deleting blank criteria and stripping trailing whitespaces
-            num_criteria = {
-                key: value.strip()
-                for key, value in num_criteria.items()
-                if value.strip() not in ("", "<", ">", "=") #no inputs are ignored
-            }
-            criteria.update(num_criteria)
+    def show_screen(self, criteria):
+        if self.screener is None:
+            return
 
-            # validating user input
-            try:
-                for value in num_criteria.values():
-                    float(re.sub("[><=]", "", value))
-            except ValueError:
-                break
+        # get filtered df, cached or a stricter screen only rechecks the previous result
+        self.filtered_df = self.screener.screen(criteria)
 
-            # get filtered df
-            self.filtered_df = filter(self.detail_df, criteria)  # type: ignore
-            
-            # render filtered_df
+        # render filtered_df in the current sort order
+        if self.sort_keys:
+            self.apply_sort()
+        else:
             self.render_df(self.filtered_df)
-            break
 
-    def my_sort(self, col: str):
+    # saves the criteria of the filter entries under a name asked for
+    def save_current_screen(self):
+        if (criteria := self.read_criteria()) is None:
+            return
+        name = tk.simpledialog.askstring("Save screen", "Name of the screen:", parent=self.window)
+        if name:
+            save_screen(name, criteria)
+            self.update_selector_screens()
+
+    def update_selector_screens(self):
+        self.selector_screens["menu"].delete(0, "end")
+        for name, criteria in load_screens().items():
+            self.selector_screens["menu"].add_command(
+                label=name, command=lambda criteria=criteria: self.show_screen(criteria)
+            )
+
+    # sort by col, or by col after the current sort keys if extend (shift-click)
+    def my_sort(self, col: str, extend=False):
+        if not hasattr(self, "filtered_df"):
+            return
+
+        if not extend:
+            self.sort_keys = [col]
+        elif col not in self.sort_keys:
+            self.sort_keys.append(col)
+        self.apply_sort()
+
+    def apply_sort(self):
+        if not self.sort_keys or not hasattr(self, "filtered_df"):
+            return
+
         if self.order.get() == "Ascending":
             is_ascending = True
         else:
             is_ascending = False
 
-        self.filtered_df.sort_values(by=[col], ascending=is_ascending, inplace=True)
+        self.filtered_df = self.sorter.sort(self.filtered_df, self.sort_keys, is_ascending)
         self.render_df(self.filtered_df)
 
 
@@ -0,0 +1,73 @@
+# benchmark describe_benefits against the old per-company dividend/bonus processing
+#
+#   python benchmarks/bench_benefits.py --companies 100 1000 5000
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from common import timed
+from app import describe_benefits
+
+
+# Company.process_benefit and Company.describe_benefit as they were before batching
+def legacy_benefit(years: list, values: list):
+    def parse_date(date_string):
+        matches = re.search(r"(\d*)-(\d*)", date_string)
+        return int(matches.group(1)), int(matches.group(2))  # type: ignore
+
+    df = pd.DataFrame()
+    df[["start_yr", "end_yr"]] = pd.Series(years).apply(lambda x: pd.Series(parse_date(x)))
+    df[["percent"]] = pd.Series(values).apply(
+        lambda x: pd.Series(float(x.strip("%").replace(",", "")))
+    )
+    df.sort_values("percent", inplace=True, ascending=False)
+    df = df.drop_duplicates(subset=["start_yr", "end_yr"], ignore_index=True, keep="first")
+
+    start, end, n = df["start_yr"].min(), df["end_yr"].max(), df.shape[0]
+    return round(df["percent"].sum() / (end - start), 2), round(n / (end - start) * 100, 2)
+
+
+def legacy_benefits(benefits: list) -> dict:
+    grouped = {}
+    for symbol, kind, year, value in benefits:
+        grouped.setdefault((symbol, kind), ([], []))
+        grouped[(symbol, kind)][0].append(year)
+        grouped[(symbol, kind)][1].append(value)
+    return {key: legacy_benefit(years, values) for key, (years, values) in grouped.items()}
+
+
+# dividend and bonus rows of n companies, with repeated fiscal years like the site has
+def make_benefits(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        for kind in ["dvnd", "bonus"]:
+            count = rng.integers(1, 20)
+            for year in rng.integers(2060, 2081, count):
+                value = f"{rng.choice([rng.uniform(0, 40), rng.uniform(1000, 1500)]):,.2f}%"
+                rows.append((f"SYM{i}", kind, f"(FY:{year}-{year + 1})", value))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark describe_benefits")
+    parser.add_argument("--companies", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    print(f"{'companies':>10} {'rows':>8} {'batched':>12} {'legacy':>12}")
+    for n in args.companies:
+        benefits = make_benefits(n)
+        fast, (metrics, invalid) = timed(describe_benefits, benefits)
+        slow, expected = timed(legacy_benefits, benefits, repeat=1)
+
+        assert not invalid
+        for (symbol, kind), (rate, prob) in expected.items():
+            assert metrics.loc[symbol, f"avg_{kind}_rate"] == rate, (symbol, kind)
+            assert metrics.loc[symbol, f"avg_{kind}_prob"] == prob, (symbol, kind)
+        print(f"{n:>10} {len(benefits):>8} {fast * 1000:>10.1f}ms {slow * 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmark the screening engine against the old query-per-criterion filter()
+#
+#   python benchmarks/bench_filter.py --sizes 500 5000 50000
+import argparse
+from time import perf_counter
+
+import pandas as pd
+
+from common import make_df, timed
+from app import Screener, ScreenCache, filter
+
+
+# filter() as it was before the screening engine, kept for comparison
+def legacy_filter(df: pd.DataFrame, criteria: dict):
+    for col in list(df.keys()):
+        try:
+            df[col] = df[col].astype(float)
+        except ValueError:
+            pass
+
+    for column, condition in criteria.items():
+        df = df.query(f"`{column}` {condition}")
+
+    filtered = pd.DataFrame()
+    for col in [
+        "Symbol", "Sector", "Market Price", "Book Value", "PBV", "EPS", "P/E Ratio",
+        "avg_dvnd_rate", "avg_dvnd_prob", "avg_bonus_rate", "avg_bonus_prob", "1 Year Yield",
+    ]:
+        filtered[col] = df[col]
+    filtered["year delta"] = df["year_delta"]
+    return filtered
+
+
+# one frame at 60fps
+FRAME_BUDGET = 1 / 60
+# PBV entry while typing "5", "3", "2.5", then deleting back to "5"
+LIVE_PBV = [5, 3, 2.5, 2, 2.5, 3, 5]
+
+CRITERIA = {
+    "Sector": "== 'Commercial Banks'",
+    "PBV": "< 3",
+    "EPS": "> 5",
+    "P/E Ratio": "< 40",
+    "avg_dvnd_rate": "> 5",
+    "avg_dvnd_prob": "> 40",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark filter()")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 50000])
+    parser.add_argument("--live-sizes", type=int, nargs="+", default=[50000, 500000])
+    args = parser.parse_args()
+
+    structured = [
+        ("Sector", "==", "Commercial Banks"),
+        ("PBV", "<", 3),
+        ("EPS", ">", 5),
+        ("P/E Ratio", "<", 40),
+        ("avg_dvnd_rate", ">", 5),
+        ("avg_dvnd_prob", ">", 40),
+    ]
+
+    print(f"{'rows':>8} {'legacy':>12} {'filter()':>12} {'screener':>12} {'cached':>12}")
+    for n in args.sizes:
+        df = make_df(n)
+        legacy, expected = timed(legacy_filter, df.copy(), CRITERIA)
+        fresh, result = timed(filter, df, CRITERIA)
+
+        # coercion is paid once when the data is loaded
+        screener = Screener(df)
+
+        def full_screen(criteria):
+            screener.last = None
+            return screener.screen(criteria)
+
+        compiled, screened = timed(full_screen, structured)
+
+        # the same screen run again with its criteria in another order
+        screener = Screener(df, ScreenCache(), version=1)
+        screener.screen(structured)
+        cached, repeated = timed(full_screen, structured[::-1])
+
+        pd.testing.assert_frame_equal(result, expected)
+        pd.testing.assert_frame_equal(screened, expected)
+        pd.testing.assert_frame_equal(repeated, expected)
+        print(
+            f"{n:>8} {legacy * 1000:>10.2f}ms {fresh * 1000:>10.2f}ms {compiled * 1000:>10.2f}ms"
+            f" {cached * 1000:>10.2f}ms"
+        )
+
+    # live filtering: each keystroke tightens or relaxes the PBV criterion
+    print(f"\nlive typing (frame budget {FRAME_BUDGET * 1000:.1f}ms)")
+    print(f"{'rows':>8} {'full pass':>12} {'narrowing':>12} {'relaxing':>12}")
+    for n in args.live_sizes:
+        screener = Screener(make_df(n))
+        keystrokes = [[("Sector", "==", "Commercial Banks"), ("PBV", "<", v)] for v in LIVE_PBV]
+
+        latency = {"full pass": [], "narrowing": [], "relaxing": []}
+        for i, criteria in enumerate(keystrokes):
+            start = perf_counter()
+            screener.screen(criteria)
+            elapsed = perf_counter() - start
+            if i == 0:
+                latency["full pass"].append(elapsed)
+            elif LIVE_PBV[i] < LIVE_PBV[i - 1]:
+                latency["narrowing"].append(elapsed)
+            else:
+                latency["relaxing"].append(elapsed)
+
+        print(f"{n:>8}" + "".join(f" {max(v) * 1000:>10.2f}ms" for v in latency.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmark HistoryStore appends and queries against reading the whole history
+#
+#   python benchmarks/bench_history.py --symbols 500 --days 365
+import argparse
+import os
+import tempfile
+from datetime import date, timedelta
+from glob import glob
+
+import pandas as pd
+
+from common import make_df, timed
+from app import HistoryStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark HistoryStore")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    today = date.today()
+    days = [str(today - timedelta(days=args.days - i)) for i in range(args.days)]
+    snapshot = make_df(args.symbols)
+
+    with tempfile.TemporaryDirectory() as folder:
+        history = HistoryStore(os.path.join(folder, "history"))
+        first = last = None
+        for i, day in enumerate(days):
+            seconds, _ = timed(history.append, snapshot.assign(scrape_date=day), repeat=1)
+            first = seconds if i == 0 else first
+            last = seconds
+
+        size = sum(os.path.getsize(path) for path in glob(os.path.join(folder, "**", "*.parquet"), recursive=True))
+        print(f"{args.symbols} symbols x {args.days} days, {size / 2**20:.1f} MiB on disk")
+        print(f"{'append first day':<32} {first * 1000:>10.1f}ms")
+        print(f"{'append day ' + str(args.days):<32} {last * 1000:>10.1f}ms")
+
+        # everything read into pandas, what a single growing file would cost
+        def read_all():
+            return history.query()
+
+        year_ago = today - timedelta(days=730)
+        month_ago = today - timedelta(days=30)
+        for name, func, query_args in [
+            ("read whole history", read_all, ()),
+            ("P/E of one symbol, 2 years", history.series, ("SYM1", "P/E Ratio", year_ago)),
+            ("PBV change since last month", history.change, ("PBV", month_ago)),
+            ("snapshot a month ago", history.snapshot, (month_ago,)),
+        ]:
+            seconds, result = timed(func, *query_args)
+            print(f"{name:<32} {seconds * 1000:>10.1f}ms {len(result):>10} rows")
+
+        changed = history.change("PBV", month_ago)
+        assert len(changed) == args.symbols
+        assert isinstance(history.series("SYM1", "PBV"), pd.Series)
+
+
+if __name__ == "__main__":
+    main()
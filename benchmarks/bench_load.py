@@ -0,0 +1,50 @@
+# benchmark DataStore.load from the arrow snapshot against rebuilding it and reading a csv export
+#
+#   python benchmarks/bench_load.py --sizes 1000 10000 100000
+import argparse
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from common import make_df, timed
+from app import DataStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark DataStore.load")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'rebuild':>12} {'arrow':>12} {'read_csv':>12} {'typed':>10} {'untyped':>10}")
+    for n in args.sizes:
+        df = make_df(n)
+        with tempfile.TemporaryDirectory() as folder:
+            store = DataStore(os.path.join(folder, "data.db"))
+            store.upsert_many(json.loads(df.to_json(orient="records")))
+            csv_path = os.path.join(folder, "data.csv")
+            store.export_csv(csv_path)
+
+            # every record decoded from sqlite, typed and written to data.arrow
+            def rebuild():
+                if os.path.exists(store.arrow_path):
+                    os.remove(store.arrow_path)
+                return store.load()
+
+            cold, typed = timed(rebuild)
+            warm, loaded = timed(store.load)
+            csv, untyped = timed(pd.read_csv, csv_path)
+            store.connection.close()
+
+        pd.testing.assert_frame_equal(typed, loaded)
+        typed_mb = typed.memory_usage(deep=True).sum() / 2**20
+        untyped_mb = untyped.memory_usage(deep=True).sum() / 2**20
+        print(
+            f"{n:>8} {cold * 1000:>10.1f}ms {warm * 1000:>10.1f}ms {csv * 1000:>10.1f}ms"
+            f" {typed_mb:>8.1f}MB {untyped_mb:>8.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
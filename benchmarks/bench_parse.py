@@ -0,0 +1,55 @@
+# benchmark parse_company_page against pd.read_html on a recorded CompanyDetail page
+#
+#   python benchmarks/bench_parse.py --repeat 200
+import os, argparse
+from io import StringIO
+from time import perf_counter
+
+import pandas as pd
+
+from common import FIXTURES
+from app import parse_company_page
+
+
+# the tables Company used from pd.read_html before the lxml parser
+def legacy_parse(page: str) -> dict:
+    dfs = pd.read_html(StringIO(page))
+    return {
+        "details": list(dfs[0].iloc[0:12].set_index(0).to_dict()[1].items()),
+        "dividends": dfs[1][["Fiscal Year", "Value"]].to_dict("records"),
+        "bonus": dfs[2][["Fiscal Year", "Value"]].to_dict("records"),
+    }
+
+
+def per_page(func, page: str, repeat: int) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        func(page)
+    return (perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark CompanyDetail parsing")
+    parser.add_argument("--page", default=os.path.join(FIXTURES, "CompanyDetail.html"))
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    with open(args.page, encoding="utf-8") as file:
+        page = file.read()
+
+    # both parsers must extract the same values
+    expected, parsed = legacy_parse(page), parse_company_page(page)
+    assert parsed["details"] == expected["details"]
+    for table in ["dividends", "bonus"]:
+        assert [(row["Fiscal Year"], row["Value"]) for row in parsed[table]] == [
+            (row["Fiscal Year"], row["Value"]) for row in expected[table]
+        ]
+
+    legacy = per_page(legacy_parse, page, args.repeat)
+    lxml = per_page(parse_company_page, page, args.repeat)
+    print(f"pd.read_html:       {legacy * 1000:8.2f}ms/page")
+    print(f"parse_company_page: {lxml * 1000:8.2f}ms/page ({legacy / lxml:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
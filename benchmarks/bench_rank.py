@@ -0,0 +1,59 @@
+# benchmark derive_metrics and rank against per-company metrics and sorting the whole universe
+#
+#   python benchmarks/bench_rank.py --sizes 1000 10000 100000 --top 20
+import argparse
+from math import sqrt
+
+import numpy as np
+import pandas as pd
+
+from common import make_df, timed
+from app import DERIVED_COLUMNS, FACE_VALUE, apply_schema, derive_metrics, rank, score
+
+
+# the derived metrics of one company at a time, like year_delta in Company.__init__
+def per_company(df: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for details in df.to_dict("records"):
+        price, eps, book_value = details["Market Price"], details["EPS"], details["Book Value"]
+        graham = sqrt(22.5 * eps * book_value) if eps > 0 and book_value > 0 else np.nan
+        rows.append({
+            "dvnd_yield": details["avg_dvnd_rate"] * FACE_VALUE / price,
+            "graham_number": graham,
+            "graham_margin": (graham / price - 1) * 100,
+            "from_year_low": (price / details["year_low"] - 1) * 100,
+            "from_year_high": (1 - price / details["year_high"]) * 100,
+        })
+    return pd.DataFrame(rows).round(2)
+
+
+# every row scored and sorted, what ranking by a spreadsheet column amounts to
+def full_sort(df: pd.DataFrame, k: int) -> pd.DataFrame:
+    return df.assign(score=score(df)).sort_values("score", ascending=False, kind="stable").head(k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark derive_metrics and rank")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'derive':>12} {'per company':>12} {'rank top':>12} {'full sort':>12}")
+    for n in args.sizes:
+        df = make_df(n)
+        vectorized, derived = timed(derive_metrics, df)
+        looped, expected = timed(per_company, df, repeat=1)
+        pd.testing.assert_frame_equal(derived[DERIVED_COLUMNS].reset_index(drop=True), expected)
+
+        typed = apply_schema(derived)
+        top, ranked = timed(rank, typed, args.top)
+        sorted_, everything = timed(full_sort, typed, args.top)
+        assert ranked["Symbol"].tolist() == everything["Symbol"].tolist()
+        print(
+            f"{n:>8} {vectorized * 1000:>10.2f}ms {looped * 1000:>10.2f}ms"
+            f" {top * 1000:>10.2f}ms {sorted_ * 1000:>10.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmark DataTable against rebuilding a Treeview with every row, needs a display
+#
+#   python benchmarks/bench_render.py --sizes 500 5000 50000
+import argparse
+from time import perf_counter
+
+from common import make_df
+import app
+from app import DataTable, curate, load_gui
+
+
+# render_df as it was before DataTable, kept for comparison
+def legacy_render(window, frame, df):
+    if frame is not None:
+        frame.destroy()
+    frame = app.ttk.Frame(window)
+    tree = app.ttk.Treeview(frame, columns=list(df.keys()), show="headings", height=50)
+    tree.grid(row=0, column=0, sticky="news")
+    vsb = app.ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+    vsb.grid(row=0, column=1, sticky="ns")
+    tree.configure(yscrollcommand=vsb.set)
+    for col in df.keys():
+        tree.column(col, width=100, anchor="center")
+        tree.heading(col, text=col)
+    for row in df.values.tolist():
+        tree.insert(parent="", index=app.tk.END, values=row)
+    frame.pack(fill="both")
+    frame.update()
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark result table rendering")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 50000])
+    args = parser.parse_args()
+
+    load_gui()
+    try:
+        window = app.tk.Tk()
+    except app.tk.TclError as error:
+        print(f"no display available: {error}")
+        return
+
+    table = DataTable(window, on_heading=lambda col, extend: None)
+    table.frame.pack(fill="both")
+    frame = None
+
+    print(f"{'rows':>8} {'rebuild':>12} {'DataTable':>12} {'re-render':>12} {'scroll':>12}")
+    for n in args.sizes:
+        df = curate(make_df(n))
+
+        start = perf_counter()
+        frame = legacy_render(window, frame, df)
+        legacy = perf_counter() - start
+
+        start = perf_counter()
+        table.set_df(df)
+        window.update()
+        first = perf_counter() - start
+
+        # a sort changes the order of the same rows
+        start = perf_counter()
+        table.set_df(df.sort_values("PBV"))
+        window.update()
+        again = perf_counter() - start
+
+        start = perf_counter()
+        for _ in range(20):
+            table.scroll(25)
+            window.update()
+        scroll = (perf_counter() - start) / 20
+
+        print(
+            f"{n:>8} {legacy * 1000:>10.1f}ms {first * 1000:>10.1f}ms "
+            f"{again * 1000:>10.1f}ms {scroll * 1000:>10.1f}ms"
+        )
+    window.destroy()
+
+
+if __name__ == "__main__":
+    main()
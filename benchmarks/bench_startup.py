@@ -0,0 +1,35 @@
+# cold-start time of the headless and gui modes, each in a fresh interpreter
+#
+#   python benchmarks/bench_startup.py --repeat 5
+import os, sys, argparse, subprocess
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "import app": ["-c", "import app"],
+    "headless (screen --help)": ["app.py", "screen", "--help"],
+    "gui imports": ["-c", "import app; app.load_gui()"],
+}
+
+
+def cold_start(args: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, check=True, capture_output=True)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark cold-start time")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, command in MODES.items():
+        print(f"{name:<26} {cold_start(command, args.repeat) * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmark NEPSE.get_update_status against the old row-by-row implementation
+#
+#   python benchmarks/bench_update_status.py --sizes 1000 10000 100000 --snapshots 3
+import argparse
+
+import pandas as pd
+
+from common import make_df, offline_market, timed
+from app import NEPSE, is_valid_df
+
+
+# get_update_status as it was before vectorizing, kept for comparison
+def legacy_update_status(market: NEPSE, smbl_list: list, full_df: pd.DataFrame):
+    full_df = full_df.copy()
+    if not is_valid_df(full_df):
+        return smbl_list, None
+
+    full_df["smbl"] = full_df["Symbol"]
+    full_df.set_index("smbl", inplace=True)
+
+    bool_outdated = full_df["scrape_date"].apply(market.is_outdated)
+    outdated_df, updated_df = full_df[bool_outdated], full_df[~bool_outdated]
+
+    df_smbls = []
+    outdated = []
+
+    for smbl in smbl_list:
+        try:
+            full_df.loc[smbl]
+            df_smbls.append(smbl)
+        except KeyError:
+            outdated.append(smbl)
+
+    if len(df_smbls) == 0:
+        return smbl_list, full_df
+    else:
+        remaining = []
+        for smbl in list(outdated_df.index.values):
+            if smbl in df_smbls:
+                outdated.append(smbl)
+            else:
+                remaining.append(outdated_df.loc[smbl])
+
+        updated_df = pd.concat([pd.DataFrame(remaining), updated_df])
+        updated_df.reset_index(inplace=True, drop=True)
+        return outdated, updated_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark NEPSE.get_update_status")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--snapshots", type=int, default=1)
+    parser.add_argument(
+        "--legacy-max", type=int, default=10000,
+        help="largest size the old implementation is run on",
+    )
+    args = parser.parse_args()
+
+    market = offline_market()
+    print(f"{'rows':>8} {'vectorized':>12} {'legacy':>12}")
+    for n in args.sizes:
+        df = make_df(n, args.snapshots)
+        # ask for half the universe plus some symbols that were never downloaded
+        smbl_list = [f"SYM{i}" for i in range(0, n, 2)] + [f"NEW{i}" for i in range(n // 100)]
+
+        fast, (outdated, updated) = timed(market.get_update_status, smbl_list, df)
+        row = f"{len(df):>8} {fast * 1000:>10.1f}ms"
+
+        # the old implementation only handled one row per symbol
+        if n <= args.legacy_max and args.snapshots == 1:
+            slow, (legacy_outdated, legacy_updated) = timed(
+                legacy_update_status, market, smbl_list, df, repeat=1
+            )
+            assert outdated == legacy_outdated
+            assert updated["Symbol"].tolist() == legacy_updated["Symbol"].tolist()
+            row += f" {slow * 1000:>10.1f}ms"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# helpers shared by the benchmark scripts
+import os, sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app import NEPSE
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SECTORS = ["Commercial Banks", "Hydro Power", "Life Insurance", "Microfinance", "Others"]
+
+
+# NEPSE without downloading the company list
+def offline_market() -> NEPSE:
+    return NEPSE.__new__(NEPSE)
+
+
+# synthetic detail df of n symbols, `snapshots` rows per symbol with older scrape dates
+def make_df(n: int, snapshots: int = 1, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    today = datetime.now().date()
+    symbols = np.array([f"SYM{i}" for i in range(n)])
+
+    frames = []
+    for snapshot in range(snapshots):
+        ages = rng.integers(0, 4, n) + snapshot * 7
+        year_high = rng.uniform(200, 2500, n)
+        year_low = year_high * rng.uniform(0.4, 0.9, n)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "Symbol": symbols,
+                    "Sector": rng.choice(SECTORS, n),
+                    "Market Price": rng.uniform(year_low, year_high),
+                    "Book Value": rng.uniform(50, 500, n),
+                    "PBV": rng.uniform(0.5, 8, n),
+                    "EPS": rng.uniform(-10, 60, n),
+                    "P/E Ratio": rng.uniform(5, 80, n),
+                    "1 Year Yield": rng.uniform(-40, 80, n),
+                    "year_high": year_high,
+                    "year_low": year_low,
+                    "year_delta": year_high - year_low,
+                    "avg_dvnd_rate": rng.uniform(0, 30, n),
+                    "avg_dvnd_prob": rng.uniform(0, 100, n),
+                    "avg_bonus_rate": rng.uniform(0, 30, n),
+                    "avg_bonus_prob": rng.uniform(0, 100, n),
+                    "scrape_date": [str(today - timedelta(days=int(age))) for age in ages],
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+# best wall time of `repeat` calls and the last result
+def timed(func, *args, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func(*args)
+        best = min(best, perf_counter() - start)
+    return best, result
@@ -0,0 +1,115 @@
+# load test of the query server: concurrent clients sending a mix of screens, sorts, ranks and symbol lookups
+#
+#   python benchmarks/load_test.py --rows 5000 --clients 16 --requests 200
+#   python benchmarks/load_test.py --url http://127.0.0.1:8050 --clients 32    # against a running `app.py serve`
+import os, json, argparse, tempfile, threading
+from contextlib import redirect_stdout
+from io import StringIO
+from time import perf_counter, sleep
+
+import numpy as np
+import requests
+
+from common import make_df
+
+
+# (path, params) of the requests every client cycles through
+QUERIES = [
+    ("/screen", {"criteria": ["PBV < 2"]}),
+    ("/screen", {"criteria": ["Sector == 'Hydro Power'", "P/E Ratio < 30"], "sort": "PBV", "limit": 20}),
+    ("/screen", {"criteria": ["avg_dvnd_prob > 60", "EPS > 10"], "sort": "P/E Ratio", "order": "desc"}),
+    ("/rank", {"top": 20}),
+    ("/rank", {"top": 10, "weights": ["dvnd_yield=1", "PBV=-1"], "criteria": ["Sector == 'Commercial Banks'"]}),
+    ("/symbol/SYM1", {}),
+]
+
+
+def client(url: str, requests_per_client: int, offset: int, latencies: list, errors: list):
+    with requests.Session() as session:
+        for i in range(requests_per_client):
+            path, params = QUERIES[(offset + i) % len(QUERIES)]
+            start = perf_counter()
+            try:
+                response = session.get(url + path, params=params, timeout=30)
+                response.raise_for_status()
+                response.json()
+            except requests.exceptions.RequestException as error:
+                errors.append(str(error))
+                continue
+            latencies.append(perf_counter() - start)
+
+
+def run(url: str, clients: int, requests_per_client: int) -> dict:
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=client, args=(url, requests_per_client, i, latencies, errors))
+        for i in range(clients)
+    ]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_s": len(latencies) / seconds,
+        **{f"p{q}_ms": float(np.percentile(latencies, q)) if len(latencies) else None for q in (50, 95, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test the query server")
+    parser.add_argument("--url", help="server to test, default: a new one over generated data")
+    parser.add_argument("--rows", type=int, default=5000, help="rows of the generated data")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    args = parser.parse_args()
+
+    server = None
+    if not args.url:
+        os.environ["FUNDY_HOME"] = tempfile.mkdtemp(prefix="fundy-load-")
+        import app
+
+        df = make_df(args.rows)
+        app.get_store().upsert_many(json.loads(df.to_json(orient="records")))
+        with redirect_stdout(StringIO()):
+            server = app.QueryServer(port=0, reload_every=0.2).start()
+        args.url = server.url
+
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for clients in args.clients:
+        result = run(args.url, clients, args.requests)
+        print(
+            f"{clients:>8} {result['requests']:>9} {result['errors']:>7} {result['requests_per_s']:>9.1f}"
+            + "".join(f" {result[f'p{q}_ms'] or 0:>7.2f}ms" for q in (50, 95, 99))
+        )
+
+    # a scrape landing while clients are querying: every client keeps being answered, the version moves on
+    if server:
+        before = requests.get(args.url + "/health").json()["version"]
+        writer = threading.Thread(
+            target=lambda: (sleep(0.1), app.get_store().upsert_many(json.loads(df.head(10).to_json(orient="records"))))
+        )
+        writer.start()
+        with redirect_stdout(StringIO()):
+            result = run(args.url, max(args.clients), args.requests)
+        writer.join()
+        sleep(0.5)
+        after = requests.get(args.url + "/health").json()["version"]
+        print(f"\nreload under load: version {before} -> {after}, {result['errors']} errors, p99 {result['p99_ms']:.2f}ms")
+
+    stats = requests.get(args.url + "/stats").json()
+    print(f"\nserver latency (ms), cache {stats['cache']}")
+    for endpoint, row in stats["latency"].items():
+        print(f"{endpoint:<10} {row['count']:>8} {row['p50'] * 1000:>9.2f} {row['p95'] * 1000:>9.2f} {row['max'] * 1000:>9.2f}")
+
+    if server:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
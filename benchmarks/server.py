@@ -0,0 +1,122 @@
+# local stand-in for merolagani serving the recorded fixtures, with latency and error injection
+#
+#   python benchmarks/server.py --port 8000 --latency 0.05 --error-rate 0.1
+#   FUNDY_BASE_URL=http://127.0.0.1:8000 python app.py scrape --symbols NABIL UPPER
+import os, argparse, random, threading
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# path on merolagani: recorded page, CompanyDetail.aspx is served for every symbol
+PAGES = {
+    "/CompanyList.aspx": "CompanyList.html",
+    "/CompanyDetail.aspx": "CompanyDetail.html",
+    "/LatestMarket.aspx": "LatestMarket.html",
+}
+
+
+class FixtureServer:
+    def __init__(self, latency=0.0, error_rate=0.0, port=0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "not_modified": 0}
+
+        self.pages = {}
+        for path, name in PAGES.items():
+            with open(os.path.join(FIXTURES, name), "rb") as file:
+                body = file.read()
+            self.pages[path] = (body, f'"{sha1(body).hexdigest()}"')
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    # response of one request as (status, body, etag)
+    def respond(self, path: str, etag_sent) -> tuple:
+        self.count("requests")
+        if self.latency:
+            sleep(self.latency)
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+        if failed:
+            self.count("errors")
+            return 503, b"Service Unavailable", None
+        if path not in self.pages:
+            return 404, b"Not Found", None
+
+        body, etag = self.pages[path]
+        if etag_sent == etag:
+            self.count("not_modified")
+            return 304, b"", etag
+        return 200, body, etag
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, body, etag = server.respond(
+                    urlsplit(self.path).path, self.headers.get("If-None-Match")
+                )
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve the merolagani fixtures locally")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = FixtureServer(args.latency, args.error_rate, args.port)
+    print(f"serving {FIXTURES} at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# reproducible benchmark suite against the local stand-in server, results written as json
+#
+#   python benchmarks/suite.py --out benchmarks/results/$(git rev-parse --short HEAD).json
+#   python benchmarks/suite.py --quick --compare benchmarks/results/<older commit>.json
+import os, sys, json, shutil, argparse, platform, subprocess, tempfile
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from io import StringIO
+from time import perf_counter
+
+# saved data of every run goes to a temporary folder, set before app is imported
+HOME = tempfile.mkdtemp(prefix="fundy-bench-")
+os.environ["FUNDY_HOME"] = HOME
+
+import numpy as np
+import pandas as pd
+
+from common import FIXTURES, ROOT, make_df, offline_market, timed
+from server import FixtureServer
+import app
+
+CRITERIA = [("PBV", "<", 2), ("P/E Ratio", "<", 30), ("Sector", "==", "Hydro Power")]
+
+
+# fresh data store and history in a new folder under HOME, and a fresh page cache unless keep_cache
+def fresh_home(name: str, keep_cache=False):
+    os.environ["FUNDY_HOME"] = os.path.join(HOME, name)
+    os.makedirs(os.environ["FUNDY_HOME"], exist_ok=True)
+    app._store = app._history = app._archive = None
+    if not keep_cache:
+        app.page_cache = app.PageCache()
+
+
+def bench_parse(results: dict, repeat: int):
+    with open(os.path.join(FIXTURES, "CompanyDetail.html"), encoding="utf-8") as file:
+        page = file.read()
+    start = perf_counter()
+    for _ in range(repeat):
+        app.parse_company_page(page)
+    results["parse/company_page_ms"] = (perf_counter() - start) / repeat * 1000
+
+
+# process_companies end to end against the server, every run starts with an empty store
+def bench_scrape(results: dict, companies: int, workers: int, rate: float, latencies: list, error_rates: list):
+    symbols = [f"SYM{i}" for i in range(companies)]
+    for latency in latencies:
+        for error_rate in error_rates:
+            name = f"scrape/latency={latency},errors={error_rate}"
+            with FixtureServer(latency, error_rate) as server:
+                app.BASE_URL = server.url
+                app.breaker = app.CircuitBreaker()
+                app.rate_limiter = app.AdaptiveLimiter(rate, max(1, int(rate)), max_rate=rate)
+                folder = name.replace("/", "-")
+                fresh_home(folder)
+
+                start = perf_counter()
+                market = app.NEPSE(max_age=None)
+                results[f"{name}/company_list_ms"] = (perf_counter() - start) * 1000
+
+                # the warm pass starts with an empty store too, but revalidates the pages cached by the cold one
+                for run in ["cold", "warm"]:
+                    fresh_home(f"{folder}-{run}", keep_cache=True)
+                    start = perf_counter()
+                    with redirect_stdout(StringIO()):
+                        df = market.process_companies(symbols, workers=workers)
+                    seconds = perf_counter() - start
+                    saved = 0 if df is None else len(df)
+                    results[f"{name}/{run}_companies_per_s"] = saved / seconds
+                    results[f"{name}/{run}_failed"] = companies - saved
+                    results[f"{name}/{run}_final_rate"] = app.rate_limiter.rate
+                    for stage, row in app.metrics.summary(app.metrics.run).items():
+                        results[f"{name}/{run}_{stage}_p95_ms"] = row["p95"] * 1000
+                results[f"{name}/not_modified"] = server.counts["not_modified"]
+
+                # next trading day: prices from the market page instead of every detail page
+                for run, full in [("daily_full", True), ("daily_tiered", False)]:
+                    fresh_home(f"{folder}-{run}", keep_cache=True)
+                    with redirect_stdout(StringIO()):
+                        market.process_companies(symbols, workers=workers, full=True)
+                        store = app.get_store()
+                        records = store.load().assign(scrape_date=str(date.today() - timedelta(days=7)))
+                        store.upsert_many(json.loads(records.to_json(orient="records")))
+
+                        requests, start = server.counts["requests"], perf_counter()
+                        market.process_companies(symbols, workers=workers, full=full)
+                    results[f"{name}/{run}_seconds"] = perf_counter() - start
+                    results[f"{name}/{run}_requests"] = server.counts["requests"] - requests
+
+
+# full scrapes with the pages parsed on the download threads (0) and on parsing processes,
+# then the same pages parsed again from the archive
+def bench_pipeline(results: dict, companies: int, workers: int, rate: float):
+    symbols = [f"SYM{i}" for i in range(max(companies, app.PARSE_MIN))]
+    with FixtureServer() as server:
+        app.BASE_URL = server.url
+        app.breaker = app.CircuitBreaker()
+        app.rate_limiter = app.AdaptiveLimiter(rate, max(1, int(rate)), max_rate=rate)
+        market = app.NEPSE(max_age=None)
+        for processes in sorted({0, 1, 2, os.cpu_count() or 1}):
+            fresh_home(f"pipeline-{processes}", keep_cache=True)
+            start = perf_counter()
+            with redirect_stdout(StringIO()):
+                df = market.process_companies(symbols, workers=workers, full=True, processes=processes)
+            results[f"pipeline/processes={processes}_companies_per_s"] = len(df) / (perf_counter() - start)
+
+            start = perf_counter()
+            with redirect_stdout(StringIO()):
+                df, _ = app.reparse(processes=processes)
+            results[f"reparse/processes={processes}_companies_per_s"] = len(df) / (perf_counter() - start)
+
+
+def bench_update_status(results: dict, sizes: list):
+    market = offline_market()
+    for n in sizes:
+        df = make_df(n)
+        smbl_list = [f"SYM{i}" for i in range(0, n, 2)]
+        seconds, _ = timed(market.get_update_status, smbl_list, df)
+        results[f"update_status/{n}_ms"] = seconds * 1000
+
+
+def bench_filter(results: dict, sizes: list):
+    for n in sizes:
+        df = make_df(n)
+        seconds, _ = timed(app.filter, df, CRITERIA)
+        results[f"filter/{n}_ms"] = seconds * 1000
+
+        screener = app.Screener(df)
+        seconds, _ = timed(screener.screen, CRITERIA)
+        results[f"screener/{n}_ms"] = seconds * 1000
+
+
+# DataTable.set_df of a new dataframe and of a reordered one, needs a display
+def bench_render(results: dict, sizes: list):
+    app.load_gui()
+    try:
+        window = app.tk.Tk()
+    except app.tk.TclError:
+        results["render/skipped"] = "no display"
+        return
+
+    table = app.DataTable(window, on_heading=lambda col, extend: None)
+    table.frame.pack(fill="both")
+    for n in sizes:
+        df = app.curate(make_df(n))
+        for name, frame in [("new", df), ("sorted", df.sort_values("PBV"))]:
+            start = perf_counter()
+            table.set_df(frame)
+            window.update()
+            results[f"render/{n}_{name}_ms"] = (perf_counter() - start) * 1000
+    window.destroy()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# new / old of every numeric result the two runs share
+def compare(old: dict, new: dict):
+    print(f"\ncompared with {old['commit']}:")
+    for key, value in new["results"].items():
+        before = old["results"].get(key)
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+            print(f"{key:<60} {before:>12.2f} {value:>12.2f} {value / before:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run every benchmark and write the results as json")
+    parser.add_argument("--out", help="json file for the results, default: stdout")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast check")
+    parser.add_argument("--companies", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=app.WORKERS)
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0, 0.05])
+    parser.add_argument("--error-rate", type=float, nargs="+", default=[0.0, 0.1])
+    parser.add_argument(
+        "--rate", type=float, default=10000.0,
+        help="starting and highest request rate of the adaptive limiter (the app uses RATE_LIMIT..RATE_MAX)",
+    )
+    args = parser.parse_args()
+
+    sizes = [1000, 10000] if args.quick else [1000, 10000, 100000]
+    companies = min(args.companies, 50) if args.quick else args.companies
+
+    results = {}
+    try:
+        bench_parse(results, 20 if args.quick else 200)
+        bench_scrape(results, companies, args.workers, args.rate, args.latency, args.error_rate)
+        bench_pipeline(results, companies, args.workers, args.rate)
+        bench_update_status(results, sizes)
+        bench_filter(results, sizes)
+        bench_render(results, sizes[:2])
+    finally:
+        shutil.rmtree(HOME, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "settings": {**vars(args), "sizes": sizes, "companies": companies},
+        "results": {key: round(value, 3) if isinstance(value, float) else value for key, value in results.items()},
+    }
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# TradingCalendar against the staleness and scrape date rules it replaced
+import os, sys
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import TradingCalendar
+
+
+# NEPSE.staleness_cutoff before the calendar: fixed 15:00 close, nothing traded on saturday
+def old_staleness_cutoff(present):
+    nepse_end = time(15, 0)
+    present_day = present.strftime("%A")
+
+    if present_day == "Sunday":
+        if present.time() > nepse_end:
+            return present.date()
+        else:
+            return present.date() - timedelta(days=2)
+
+    elif present_day == "Saturday":
+        return present.date() - timedelta(days=1)
+
+    else:
+        if present.time() > nepse_end:
+            return present.date()
+        else:
+            return present.date() - timedelta(days=1)
+
+
+# scrape_day before the calendar: saturday scrapes count for friday
+def old_scrape_day(today):
+    if today.strftime("%A") == "Saturday":
+        return today.date() - timedelta(days=1)
+    return today.date()
+
+
+# every half hour of two weeks, starting on a saturday
+def sweep():
+    start = datetime(2024, 1, 6)
+    return [start + timedelta(minutes=30 * i) for i in range(14 * 48)]
+
+
+def test_last_session_matches_old_cutoff_without_holidays():
+    calendar = TradingCalendar()
+    for present in sweep():
+        assert calendar.last_session(present) == old_staleness_cutoff(present), present
+
+
+def test_session_of_matches_old_scrape_day_without_holidays():
+    calendar = TradingCalendar()
+    for present in sweep():
+        assert calendar.session_of(present) == old_scrape_day(present), present
+
+
+def test_holiday_is_skipped():
+    # wednesday 2024-01-10 is a holiday
+    calendar = TradingCalendar(holidays=[date(2024, 1, 10)])
+
+    assert calendar.last_session(datetime(2024, 1, 10, 16, 0)) == date(2024, 1, 9)
+    assert calendar.last_session(datetime(2024, 1, 11, 10, 0)) == date(2024, 1, 9)
+    assert calendar.last_session(datetime(2024, 1, 11, 16, 0)) == date(2024, 1, 11)
+    assert calendar.session_of(datetime(2024, 1, 10, 12, 0)) == date(2024, 1, 9)
+
+    # the tuesday session is current until thursday's close, the old rule called it stale on thursday morning
+    present = datetime(2024, 1, 11, 10, 0)
+    assert old_staleness_cutoff(present) > date(2024, 1, 9)
+    assert not calendar.last_session(present) > date(2024, 1, 9)
+
+
+def test_holidays_file(tmp_path):
+    path = tmp_path / "holidays.txt"
+    path.write_text("# dashain\n2024-10-10\n2024-10-11  # tihar\n\n")
+
+    calendar = TradingCalendar.load(str(path))
+    assert calendar.holidays == {date(2024, 10, 10), date(2024, 10, 11)}
+    assert calendar.last_session(datetime(2024, 10, 12, 12, 0)) == date(2024, 10, 9)
+    assert TradingCalendar.load(str(tmp_path / "missing.txt")).holidays == set()
@@ -0,0 +1,57 @@
+# keep_newer: reparsed records must not take the stored data back in time
+import os, sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import apply_schema, keep_newer
+
+
+# details of one company as saved, prices at `price`
+def details(symbol, scrape_date, fundamentals_date=None, price=100.0, eps=10.0):
+    return {
+        "Symbol": symbol,
+        "Sector": "Hydro Power",
+        "Market Price": price,
+        "year_high": 150.0,
+        "year_low": 80.0,
+        "year_delta": 70.0,
+        "Book Value": 50.0,
+        "PBV": round(price / 50.0, 2),
+        "EPS": eps,
+        "P/E Ratio": round(price / eps, 2),
+        "avg_dvnd_rate": 10.0,
+        "scrape_date": scrape_date,
+        "fundamentals_date": fundamentals_date if fundamentals_date else scrape_date,
+    }
+
+
+def stored(*records):
+    return apply_schema(pd.DataFrame(list(records)))
+
+
+def test_symbol_not_stored_is_reparsed_as_is():
+    reparsed = [details("NEW", "2024-01-01"), details("OLD", "2024-01-02")]
+    kept = keep_newer(reparsed, stored(details("OLD", "2024-01-01")))
+    assert kept == reparsed
+
+
+def test_newer_stored_price_is_kept_on_reparsed_fundamentals():
+    reparsed = [details("ABC", "2024-01-01", eps=20.0)]
+    current = stored(details("ABC", "2024-01-05", "2024-01-01", price=200.0, eps=10.0))
+
+    (kept,) = keep_newer(reparsed, current)
+    assert kept["Market Price"] == 200.0
+    assert kept["EPS"] == 20.0
+    assert kept["P/E Ratio"] == 10.0
+    assert kept["PBV"] == 4.0
+    assert kept["scrape_date"] == "2024-01-05"
+    assert kept["fundamentals_date"] == "2024-01-01"
+
+
+def test_newer_stored_fundamentals_are_left_out():
+    reparsed = [details("ABC", "2024-01-01"), details("XYZ", "2024-01-01")]
+    current = stored(details("ABC", "2024-01-05"), details("XYZ", "2024-01-01"))
+
+    kept = keep_newer(reparsed, current)
+    assert [record["Symbol"] for record in kept] == ["XYZ"]
@@ -0,0 +1,29 @@
+# narrowing a previous screen must not depend on the types of the criteria
+import os, sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import RESULT_COLUMNS, Screener, filter, implies
+
+
+def test_text_value_against_a_numeric_bound_does_not_narrow():
+    assert not implies(("PBV", "==", "x"), ("PBV", "<", 2.0))
+    assert implies(("PBV", "==", 1.0), ("PBV", "<", 2.0))
+
+
+def test_screen_after_a_numeric_screen():
+    df = pd.DataFrame({column: [1.0, 3.0] for column in RESULT_COLUMNS}).assign(Symbol=["A", "B"], Sector="Others")
+    screener = Screener(df)
+    assert list(screener.positions([("PBV", "<", 2.0)])) == [0]
+    assert len(screener.positions([("PBV", "==", "x")])) == 0
+
+
+def test_filter_leaves_typed_and_text_frames_unchanged():
+    typed = pd.DataFrame({column: [1.0, 3.0] for column in RESULT_COLUMNS}).assign(Symbol=["A", "B"], Sector="Others")
+    text = typed.astype({"PBV": str, "EPS": str})
+    for df in (typed, text):
+        before = df.copy()
+        result = filter(df, [("PBV", "<", 2.0), ("EPS", ">", 0.5)])
+        assert list(result["Symbol"]) == ["A"]
+        pd.testing.assert_frame_equal(df, before)